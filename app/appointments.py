@@ -0,0 +1,102 @@
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from zoneinfo import ZoneInfo
+
+from app import calendar as cal
+from app import reminders
+from app.models import Appointment
+
+def start_of(appointment: Appointment, tz: ZoneInfo) -> datetime.datetime:
+    return reminders.as_utc(appointment.start_at).astimezone(tz)
+
+
+def record(
+    session: Session,
+    user_phone: str,
+    event_id: Optional[str],
+    start_time: datetime.datetime,
+    duration_minutes: int,
+    service_id: Optional[str],
+) -> Appointment:
+    """Index a booking locally so lookups never have to search the calendar."""
+    appointment = Appointment(
+        phone=user_phone,
+        event_id=event_id,
+        service_id=service_id,
+        start_at=reminders.as_utc(start_time),
+        duration_minutes=duration_minutes,
+        status="booked",
+    )
+    session.add(appointment)
+    session.flush()
+    return appointment
+
+
+def upcoming(session: Session, user_phone: str, limit: int = 3) -> List[Appointment]:
+    now = datetime.datetime.now(tz=reminders.UTC)
+    stmt = (
+        select(Appointment)
+        .where(Appointment.phone == user_phone, Appointment.start_at > now, Appointment.status == "booked")
+        .order_by(Appointment.start_at)
+        .limit(limit)
+    )
+    return list(session.scalars(stmt))
+
+
+def get_owned(session: Session, appointment_id: int, user_phone: str) -> Optional[Appointment]:
+    """Booked appointment by id, only if it belongs to ``user_phone``."""
+    appointment = session.get(Appointment, appointment_id)
+    if not appointment or appointment.phone != user_phone or appointment.status != "booked":
+        return None
+    return appointment
+
+
+def cancel(session: Session, appointment: Appointment) -> None:
+    if appointment.event_id:
+        cal.cancel_appointment(appointment.event_id)
+    reminders.cancel_for_event(session, appointment.event_id)
+    appointment.status = "cancelled"
+
+
+def _end_of(start: datetime.datetime, appointment: Appointment) -> datetime.datetime:
+    return start + datetime.timedelta(minutes=appointment.duration_minutes)
+
+
+def _without(
+    block: Tuple[datetime.datetime, datetime.datetime],
+    hole: Tuple[datetime.datetime, datetime.datetime],
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """Parts of ``block`` outside ``hole``."""
+    start, end = block
+    pieces = [(start, min(end, hole[0])), (max(start, hole[1]), end)]
+    return [(a, b) for a, b in pieces if a < b]
+
+
+def can_move_to(appointment: Appointment, new_start: datetime.datetime) -> bool:
+    """True when nothing but the appointment itself occupies the new time."""
+    new_end = _end_of(new_start, appointment)
+    own_start = reminders.as_utc(appointment.start_at)
+    own = (own_start, _end_of(own_start, appointment))
+    # The own event is busy too (and freebusy merges it with adjacent events), so cut it out
+    for block in cal.fetch_busy(new_start, new_end):
+        for start, end in _without(block, own):
+            if start < new_end and new_start < end:
+                return False
+    return True
+
+
+def reschedule(session: Session, appointment: Appointment, new_start: datetime.datetime, tz: ZoneInfo) -> None:
+    """Move the event; if it was deleted in the calendar meanwhile, mark it cancelled and re-raise."""
+    if appointment.event_id:
+        try:
+            cal.move_appointment(appointment.event_id, new_start, appointment.duration_minutes, tz)
+        except cal.EventNotFound:
+            reminders.cancel_for_event(session, appointment.event_id)
+            appointment.status = "cancelled"
+            raise
+    reminders.cancel_for_event(session, appointment.event_id)
+    appointment.start_at = reminders.as_utc(new_start)
+    reminders.schedule_for_appointment(session, appointment.phone, new_start, appointment.event_id)
@@ -0,0 +1,235 @@
+import heapq
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_BACKEND_URL = os.getenv("SHARED_BACKEND_URL", "")  # e.g. redis://localhost:6379/0
+BACKEND_KEY_PREFIX = os.getenv("BACKEND_KEY_PREFIX", "edna:")
+
+# Expired entries the in-process backend drops per write; bounds the work per request
+_PRUNE_BATCH = 64
+
+# Token bucket update in one round trip. Uses the Redis clock so nodes with
+# skewed clocks still agree on refill time.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry)
+"""
+
+# Concurrency lease: holders live in a sorted set scored by expiry, so a worker
+# that dies while holding a slot only blocks it until the lease runs out.
+_LEASE_LUA = """
+local limit = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+  return 0
+end
+redis.call('ZADD', KEYS[1], now + lease, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease) + 1)
+return 1
+"""
+
+
+class MemoryBackend:
+    """In-process backend; expired keys are dropped a few at a time on every write.
+
+    Expiry times sit in a min-heap next to the data, so each write pops at most
+    ``_PRUNE_BATCH`` entries instead of scanning the map. Past ``max_keys`` the
+    soonest-expiring keys are evicted first; keys without a TTL are never evicted.
+    """
+
+    shared = False
+
+    def __init__(self, clock: Callable[[], float] = time.time, max_keys: int = 10_000) -> None:
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}  # key -> (value, expires_at)
+        self._expiries: List[Tuple[float, str]] = []  # heap of (expires_at, key); may hold stale entries
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated_at), oldest update first
+        self._leases: Dict[str, Dict[str, float]] = {}  # key -> {token: expires_at}
+        self._max_keys = max_keys
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def _store(self, key: str, value: str, ttl_seconds: Optional[float], now: float) -> None:
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        self._data[key] = (value, expires_at)
+        if expires_at is not None:
+            heapq.heappush(self._expiries, (expires_at, key))
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        if len(self._expiries) > 2 * self._max_keys:
+            # Mostly stale entries left by overwritten keys; rebuild from the live data
+            self._expiries = [(exp, k) for k, (_, exp) in self._data.items() if exp is not None]
+            heapq.heapify(self._expiries)
+        for _ in range(_PRUNE_BATCH):
+            if not self._expiries:
+                return
+            expires_at, key = self._expiries[0]
+            if expires_at > now and len(self._data) <= self._max_keys:
+                return
+            heapq.heappop(self._expiries)
+            item = self._data.get(key)
+            if item is not None and item[1] == expires_at:  # not overwritten since
+                del self._data[key]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key, self.clock())
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl_seconds, self.clock())
+
+    def set_if_absent(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> bool:
+        with self._lock:
+            now = self.clock()
+            if self._live(key, now) is not None:
+                return False
+            self._store(key, value, ttl_seconds, now)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def take(self, key: str, capacity: float, refill_rate: float, cost: float, now: Optional[float] = None) -> float:
+        with self._lock:
+            now = self.clock() if now is None else now
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / refill_rate if refill_rate > 0 else float("inf")
+            self._buckets[key] = (tokens, now)  # re-inserted last: dict order is update order
+            # A bucket that has refilled completely carries no state worth keeping
+            full_after = capacity / refill_rate if refill_rate > 0 else float("inf")
+            for _ in range(_PRUNE_BATCH):
+                oldest = next(iter(self._buckets))
+                if now - self._buckets[oldest][1] < full_after or oldest == key:
+                    break
+                del self._buckets[oldest]
+            return retry_after
+
+    def acquire_lease(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        """Token for one of ``limit`` concurrent slots under ``key``, or None when all are held."""
+        with self._lock:
+            now = self.clock()
+            holders = self._leases.setdefault(key, {})
+            for token in [t for t, expires_at in holders.items() if expires_at <= now]:
+                del holders[token]
+            if len(holders) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            holders[token] = now + lease_seconds
+            return token
+
+    def release_lease(self, key: str, token: str) -> None:
+        with self._lock:
+            self._leases.get(key, {}).pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expiries.clear()
+            self._buckets.clear()
+            self._leases.clear()
+
+
+class RedisBackend:
+    """Backend speaking the Redis protocol (redis-py client or a compatible fake)."""
+
+    shared = True
+
+    def __init__(self, client: Any, prefix: str = BACKEND_KEY_PREFIX) -> None:
+        self.client = client
+        self.prefix = prefix
+        self._token_bucket = client.register_script(_TOKEN_BUCKET_LUA)
+        self._lease = client.register_script(_LEASE_LUA)
+
+    def _k(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self._k(key))
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        self.client.set(self._k(key), value, px=int(ttl_seconds * 1000) if ttl_seconds else None)
+
+    def set_if_absent(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> bool:
+        px = int(ttl_seconds * 1000) if ttl_seconds else None
+        return bool(self.client.set(self._k(key), value, px=px, nx=True))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._k(key))
+
+    def take(self, key: str, capacity: float, refill_rate: float, cost: float, now: Optional[float] = None) -> float:
+        # ``now`` is ignored: the script reads the Redis server clock
+        result = self._token_bucket(keys=[self._k(f"bucket:{key}")], args=[capacity, refill_rate, cost])
+        return float(result.decode("utf-8") if isinstance(result, bytes) else result)
+
+    def acquire_lease(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = self._lease(keys=[self._k(f"lease:{key}")], args=[limit, lease_seconds, token])
+        return token if int(acquired) else None
+
+    def release_lease(self, key: str, token: str) -> None:
+        self.client.zrem(self._k(f"lease:{key}"), token)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def _create_backend():
+    if not SHARED_BACKEND_URL:
+        return MemoryBackend()
+    import redis  # optional dependency, only needed for multi-worker deployments
+
+    logger.info("Using shared backend at %s", SHARED_BACKEND_URL.split("@")[-1])
+    return RedisBackend(redis.Redis.from_url(SHARED_BACKEND_URL, decode_responses=True))
+
+
+current = _create_backend()
+
+
+def is_shared() -> bool:
+    return getattr(current, "shared", False)
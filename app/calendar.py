@@ -1,16 +1,44 @@
 import datetime
+import json
+import logging
 import os
-from typing import List, Optional
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app import backend
+from app import google_api
+from app import metrics
+from app import schedule
+
+logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 CALENDAR_ID = os.getenv("CALENDAR_ID", "primary")
 SA_CREDS_PATH = os.getenv("SA_CREDS_PATH", "service-account.json")
 DELEGATED_USER = os.getenv("CALENDAR_DELEGATED_USER")
 
+# Slot searches are cached briefly in the shared backend; bookings invalidate them.
+AVAILABILITY_CACHE_SECONDS = int(os.getenv("AVAILABILITY_CACHE_SECONDS", "60"))
+# Last successful search, served while the Google circuit breaker is open
+LAST_KNOWN_TTL_SECONDS = 24 * 60 * 60
+# Bookings must start at least this far in the future
+LEAD_TIME_MINUTES = 30
+
+
+class EventNotFound(Exception):
+    """The event was deleted in Google Calendar (e.g. by Edna) since it was booked."""
+
+
+def _is_gone(exc: HttpError) -> bool:
+    return int(exc.resp.status) in (404, 410)
+
 
 def _get_calendar_service():
     creds = service_account.Credentials.from_service_account_file(SA_CREDS_PATH, scopes=SCOPES)
@@ -24,6 +52,22 @@ def _ensure_tz(dt: datetime.datetime, tz: ZoneInfo) -> datetime.datetime:
     return dt if dt.tzinfo else dt.replace(tzinfo=tz)
 
 
+def _dump_slots(slots: List[datetime.datetime]) -> str:
+    return json.dumps([slot.isoformat() for slot in slots])
+
+
+def _load_slots(key: str) -> Optional[List[datetime.datetime]]:
+    raw = backend.current.get(key)
+    if raw is None:
+        return None
+    return [datetime.datetime.fromisoformat(value) for value in json.loads(raw)]
+
+
+def invalidate_availability() -> None:
+    """Drop cached slot searches (every worker) after the calendar changed."""
+    backend.current.set("availability:gen", str(time.time_ns()))
+
+
 def is_slot_free(start_time: datetime.datetime, duration_minutes: int = 60, tz: Optional[ZoneInfo] = None) -> bool:
     """Check if a given slot is free using Calendar freebusy."""
     tzinfo = tz or ZoneInfo(os.getenv("TZ", "UTC"))
@@ -36,11 +80,35 @@ def is_slot_free(start_time: datetime.datetime, duration_minutes: int = 60, tz:
         "timeMax": end_time.isoformat(),
         "items": [{"id": CALENDAR_ID}],
     }
-    result = service.freebusy().query(body=body).execute()
+    result = google_api.execute(service.freebusy().query(body=body), op="freebusy")
     busy = result.get("calendars", {}).get(CALENDAR_ID, {}).get("busy", [])
     return len(busy) == 0
 
 
+def fetch_busy(
+    time_min: datetime.datetime,
+    time_max: datetime.datetime,
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """All busy intervals in [time_min, time_max) from a single freebusy call."""
+    service = _get_calendar_service()
+    body = {
+        "timeMin": time_min.isoformat(),
+        "timeMax": time_max.isoformat(),
+        "items": [{"id": CALENDAR_ID}],
+    }
+    result = google_api.execute(service.freebusy().query(body=body), op="freebusy")
+    busy = result.get("calendars", {}).get(CALENDAR_ID, {}).get("busy", [])
+    return [
+        (datetime.datetime.fromisoformat(block["start"]), datetime.datetime.fromisoformat(block["end"]))
+        for block in busy
+    ]
+
+
+@lru_cache(maxsize=8)
+def _default_schedule(tz: ZoneInfo, work_start_hour: int, work_end_hour: int) -> schedule.CompiledSchedule:
+    return schedule.CompiledSchedule(schedule.default_rules(work_start_hour, work_end_hour), tz)
+
+
 def find_next_slots(
     tz: ZoneInfo,
     work_start_hour: int,
@@ -48,39 +116,88 @@ def find_next_slots(
     slot_minutes: int,
     lookahead_days: int,
     max_slots: int = 6,
+    rules: Optional[schedule.CompiledSchedule] = None,
+    step_minutes: Optional[int] = None,
+    min_fragment_minutes: int = 0,
 ) -> List[datetime.datetime]:
-    """Generate the next available slots within the work window."""
+    """Find start times for a ``slot_minutes`` booking within working hours.
+
+    ``rules`` is a compiled weekly template (see ``app.schedule``); without it a
+    single ``work_start_hour``-``work_end_hour`` window, closed Fri/Sat, is used.
+    Starts are taken every ``step_minutes`` (default ``slot_minutes``) plus the
+    edges of free gaps, best fit first: placements leaving no leftover shorter
+    than ``min_fragment_minutes`` win, then earlier days. The result is sorted
+    by time.
+    While Google is unavailable (circuit open) the last known availability is
+    returned instead, minus slots that have already passed.
+    """
+    rules = rules or _default_schedule(tz, work_start_hour, work_end_hour)
     now = datetime.datetime.now(tz=tz)
-    slots: List[datetime.datetime] = []
-    min_start = now + datetime.timedelta(minutes=30)
-
-    for day_offset in range(lookahead_days):
-        day = now.date() + datetime.timedelta(days=day_offset)
-        # Skip Friday/Saturday by default (Israel weekend)
-        if day.weekday() in (4, 5):
-            continue
-
-        day_start = datetime.datetime(
-            year=day.year,
-            month=day.month,
-            day=day.day,
-            hour=work_start_hour,
-            minute=0,
-            tzinfo=tz,
-        )
-        day_end = day_start.replace(hour=work_end_hour, minute=0)
-
-        slot_dt = day_start
-        step = datetime.timedelta(minutes=slot_minutes)
-        while slot_dt < day_end:
-            if slot_dt >= min_start and is_slot_free(slot_dt, duration_minutes=slot_minutes, tz=tz):
-                slots.append(slot_dt)
-                if len(slots) >= max_slots:
-                    return slots
-            slot_dt += step
+    min_start = now + datetime.timedelta(minutes=LEAD_TIME_MINUTES)
+    step = step_minutes or slot_minutes
+    signature = f"{rules.fingerprint}:{slot_minutes}:{step}:{min_fragment_minutes}:{lookahead_days}:{max_slots}"
+    generation = backend.current.get("availability:gen") or "0"
+    fresh_key = f"availability:fresh:{generation}:{signature}"
+    last_known_key = f"availability:last_known:{signature}"
+
+    cached = _load_slots(fresh_key)
+    # A cached answer is only reusable while none of its slots has slipped into the past
+    if cached is not None and all(slot >= min_start for slot in cached):
+        metrics.incr("availability_cache_hit")
+        return cached
+
+    try:
+        slots = _search_slots(now, min_start, rules, slot_minutes, lookahead_days, max_slots, step, min_fragment_minutes)
+    except google_api.CircuitOpenError:
+        degraded = [slot for slot in _load_slots(last_known_key) or [] if slot >= min_start]
+        if not degraded:
+            raise
+        logger.warning("Calendar unavailable; serving %s last-known slots", len(degraded))
+        metrics.incr("calendar_degraded_served")
+        return degraded[:max_slots]
+
+    payload = _dump_slots(slots)
+    backend.current.set(fresh_key, payload, ttl_seconds=AVAILABILITY_CACHE_SECONDS)
+    backend.current.set(last_known_key, payload, ttl_seconds=LAST_KNOWN_TTL_SECONDS)
     return slots
 
 
+def _search_slots(
+    now: datetime.datetime,
+    min_start: datetime.datetime,
+    rules: schedule.CompiledSchedule,
+    slot_minutes: int,
+    lookahead_days: int,
+    max_slots: int,
+    step_minutes: Optional[int] = None,
+    min_fragment_minutes: int = 0,
+) -> List[datetime.datetime]:
+    days = [now.date() + datetime.timedelta(days=offset) for offset in range(lookahead_days)]
+    open_days = [day for day in days if rules.day_mask(day)]
+    if not open_days:
+        return []
+
+    # One freebusy call for the whole lookahead instead of one per candidate slot
+    window_start = datetime.datetime(open_days[0].year, open_days[0].month, open_days[0].day, tzinfo=rules.tz)
+    last = open_days[-1] + datetime.timedelta(days=1)
+    window_end = datetime.datetime(last.year, last.month, last.day, tzinfo=rules.tz)
+    busy = fetch_busy(max(window_start, min_start), window_end)
+
+    ranked = []
+    for day_index, day in enumerate(open_days):
+        for wasted, fragments, start in rules.placements(
+            day,
+            busy,
+            length=slot_minutes,
+            step=step_minutes or slot_minutes,
+            min_fragment=min_fragment_minutes,
+            earliest=min_start,
+        ):
+            ranked.append((wasted, day_index, fragments, start))
+    ranked.sort()
+    return sorted(start for *_, start in ranked[:max_slots])
+
+
 def create_appointment(
     summary: str,
     start_time: datetime.datetime,
@@ -102,11 +219,66 @@ def create_appointment(
     if note:
         description_parts.append(f"Notes: {note}")
 
+    # Client-chosen id makes the insert idempotent: if a retried attempt already
+    # went through on Google's side, the retry gets 409 for this id instead of a duplicate.
+    event_id = uuid.uuid4().hex
     event = {
+        "id": event_id,
         "summary": summary,
         "location": "Edna Hairdresser",
         "description": "\n".join(description_parts),
         "start": {"dateTime": start.isoformat(), "timeZone": str(tz)},
         "end": {"dateTime": end.isoformat(), "timeZone": str(tz)},
     }
-    return service.events().insert(calendarId=CALENDAR_ID, body=event, sendUpdates="all").execute()
+    try:
+        created = google_api.execute(
+            service.events().insert(calendarId=CALENDAR_ID, body=event, sendUpdates="all"),
+            op="events.insert",
+        )
+    except HttpError as exc:
+        if int(exc.resp.status) != 409:
+            raise
+        logger.info("Event %s already created by an earlier attempt", event_id)
+        created = google_api.execute(
+            service.events().get(calendarId=CALENDAR_ID, eventId=event_id),
+            op="events.get",
+        )
+    invalidate_availability()
+    return created
+
+
+def cancel_appointment(event_id: str) -> None:
+    """Delete a single event by id and notify attendees; an already deleted event is fine."""
+    service = _get_calendar_service()
+    try:
+        google_api.execute(
+            service.events().delete(calendarId=CALENDAR_ID, eventId=event_id, sendUpdates="all"),
+            op="events.delete",
+        )
+    except HttpError as exc:
+        if not _is_gone(exc):
+            raise
+        logger.info("Event %s was already deleted", event_id)
+    invalidate_availability()
+
+
+def move_appointment(event_id: str, start_time: datetime.datetime, duration_minutes: int, tz: ZoneInfo):
+    """Patch only the start/end of an existing event; raises EventNotFound if it was deleted."""
+    service = _get_calendar_service()
+    start = _ensure_tz(start_time, tz)
+    end = start + datetime.timedelta(minutes=duration_minutes)
+    body = {
+        "start": {"dateTime": start.isoformat(), "timeZone": str(tz)},
+        "end": {"dateTime": end.isoformat(), "timeZone": str(tz)},
+    }
+    try:
+        updated = google_api.execute(
+            service.events().patch(calendarId=CALENDAR_ID, eventId=event_id, body=body, sendUpdates="all"),
+            op="events.patch",
+        )
+    except HttpError as exc:
+        if _is_gone(exc):
+            raise EventNotFound(event_id) from exc
+        raise
+    invalidate_availability()
+    return updated
@@ -2,7 +2,7 @@ import os
 from contextlib import contextmanager
 from typing import Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./edna.db")
@@ -40,3 +40,17 @@ def init_db() -> None:
     from app import models  # local import to avoid circular
 
     models.Base.metadata.create_all(bind=engine)
+    _add_missing_columns(models.Base.metadata)
+
+
+def _add_missing_columns(metadata) -> None:
+    """Add nullable columns introduced after a table was first created (no migrations here)."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+GAPI_MAX_RETRIES = int(os.getenv("GAPI_MAX_RETRIES", "4"))
+GAPI_BACKOFF_BASE_SECONDS = float(os.getenv("GAPI_BACKOFF_BASE_SECONDS", "0.5"))
+GAPI_BACKOFF_MAX_SECONDS = float(os.getenv("GAPI_BACKOFF_MAX_SECONDS", "8"))
+
+# Client-side pacing: starts at GAPI_RATE_PER_SEC, halves on quota errors, creeps back up on success.
+GAPI_RATE_PER_SEC = float(os.getenv("GAPI_RATE_PER_SEC", "5"))
+GAPI_MIN_RATE_PER_SEC = float(os.getenv("GAPI_MIN_RATE_PER_SEC", "0.5"))
+GAPI_MAX_RATE_PER_SEC = float(os.getenv("GAPI_MAX_RATE_PER_SEC", "10"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GAPI_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("GAPI_BREAKER_RESET_SECONDS", "30"))
+
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Google while the circuit breaker is open."""
+
+
+def _error_reason(exc: HttpError) -> Optional[str]:
+    try:
+        data = json.loads(exc.content.decode("utf-8") if isinstance(exc.content, bytes) else exc.content)
+        errors = data.get("error", {}).get("errors", [])
+        return errors[0].get("reason") if errors else None
+    except Exception:
+        return None
+
+
+def is_quota_error(exc: Exception) -> bool:
+    if not isinstance(exc, HttpError):
+        return False
+    status = int(exc.resp.status)
+    return status == 429 or (status == 403 and _error_reason(exc) in _RATE_LIMIT_REASONS)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, HttpError):
+        return is_quota_error(exc) or int(exc.resp.status) >= 500
+    # Socket timeouts / connection resets from httplib2
+    return isinstance(exc, (OSError, TimeoutError))
+
+
+class AdaptiveRateLimiter:
+    """AIMD pacing of outgoing calls: additive increase, multiplicative decrease."""
+
+    def __init__(
+        self,
+        rate: float = GAPI_RATE_PER_SEC,
+        min_rate: float = GAPI_MIN_RATE_PER_SEC,
+        max_rate: float = GAPI_MAX_RATE_PER_SEC,
+        increase: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next_at)
+            self._next_at = start + 1.0 / self.rate
+            wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        metrics.incr("gapi_rate_decreased")
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_seconds:
+                # Let a single trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Google API circuit opened after %s failures", self._failures)
+                    metrics.incr("gapi_circuit_opened")
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+
+rate_limiter = AdaptiveRateLimiter()
+breaker = CircuitBreaker()
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(GAPI_BACKOFF_MAX_SECONDS, GAPI_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def execute(request: Any, op: str = "call") -> Any:
+    """Execute a googleapiclient request with pacing, retries and the circuit breaker."""
+    if not breaker.allow():
+        metrics.incr("gapi_circuit_rejected")
+        raise CircuitOpenError(op)
+
+    for attempt in range(1, GAPI_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            result = request.execute()
+        except Exception as exc:
+            if is_quota_error(exc):
+                rate_limiter.on_throttle()
+            if not is_retryable(exc):
+                # Client errors (404, bad request) mean Google answered; it is healthy
+                breaker.record_success()
+                raise
+            metrics.incr("gapi_retries")
+            logger.warning("Google API %s failed (attempt %s): %s", op, attempt, exc)
+            if attempt == GAPI_MAX_RETRIES:
+                breaker.record_failure()
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        rate_limiter.on_success()
+        breaker.record_success()
+        return result
@@ -0,0 +1,112 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional, Tuple
+
+from pythonjsonlogger import jsonlogger
+
+from app import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of INFO/DEBUG records kept; WARNING and above are never sampled out
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "512"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+class Truncated:
+    """Log argument that is shortened only if the record is actually emitted."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = LOG_MAX_PAYLOAD_CHARS) -> None:
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, bytes):
+            # Slice before decoding so huge bodies are never decoded in full
+            text = value[: self.limit + 1].decode("utf-8", errors="replace")
+            total = len(value)
+        else:
+            text = value if isinstance(value, str) else repr(value)
+            total = len(text)
+        if total <= self.limit:
+            return text
+        return f"{text[:self.limit]}...(+{total - self.limit} chars)"
+
+    __repr__ = __str__
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float = LOG_SAMPLE_RATE) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Never block the request on a full log queue; count the drop instead."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated after the call returns) but leave
+        # JSON formatting to the listener thread. Work on a copy, as the stdlib
+        # does, so other handlers still see the caller's args and exc_info.
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr("log_records_dropped")
+
+
+def json_formatter() -> logging.Formatter:
+    return jsonlogger.JsonFormatter(
+        "%(asctime)s %(levelname)s %(name)s %(message)s",
+        rename_fields={"levelname": "level"},
+    )
+
+
+def build_queue_handler(
+    target: logging.Handler,
+    sample_rate: float = LOG_SAMPLE_RATE,
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> Tuple[QueueHandler, QueueListener]:
+    """Queue handler for the request path plus the listener thread that feeds ``target``."""
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+    listener = QueueListener(log_queue, target, respect_handler_level=True)
+    return handler, listener
+
+
+def configure_logging() -> Optional[QueueListener]:
+    """Install JSON logging to stdout, formatted and written by a background thread."""
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if root.handlers:
+        return None  # already configured (e.g. by the host or tests)
+    stream = logging.StreamHandler()
+    stream.setFormatter(json_formatter())
+    handler, listener = build_queue_handler(stream)
+    root.addHandler(handler)
+    listener.start()
+    atexit.register(listener.stop)  # flush what is still queued on shutdown
+    return listener
@@ -4,13 +4,24 @@ import os
 from typing import Any, Dict, List, Optional
 
 from fastapi import Depends, FastAPI, HTTPException, Request
-from pythonjsonlogger import jsonlogger
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from zoneinfo import ZoneInfo
 
+from app import appointments
+from app import backend
 from app import calendar as cal
 from app import db
+from app import google_api
+from app import logging_setup
+from app import metrics
+from app import payload
+from app import ratelimit
+from app import reminders
+from app import schedule
+from app import services
 from app import state
 from app import wa_client
 
@@ -22,19 +33,13 @@ except Exception:
     # Running without python-dotenv (production containers) is fine
     pass
 
-_root_logger = logging.getLogger()
-if not _root_logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = jsonlogger.JsonFormatter(
-        "%(asctime)s %(levelname)s %(name)s %(message)s",
-        rename_fields={"levelname": "level"},
-    )
-    handler.setFormatter(formatter)
-    _root_logger.addHandler(handler)
-_root_logger.setLevel(logging.INFO)
+logging_setup.configure_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Edna Hairdresser WhatsApp Bot")
+app = FastAPI(
+    title="Edna Hairdresser WhatsApp Bot",
+    default_response_class=ORJSONResponse if payload.orjson else JSONResponse,
+)
 
 # --- Configuration ---
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "change_me")
@@ -44,9 +49,14 @@ TIMEZONE = ZoneInfo(os.getenv("TZ", "Asia/Jerusalem"))
 # Working hours defaults (24h clock)
 WORK_START_HOUR = int(os.getenv("WORK_START_HOUR", "9"))
 WORK_END_HOUR = int(os.getenv("WORK_END_HOUR", "17"))
-SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "60"))
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "60"))  # used when no service was chosen (legacy buttons)
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "30"))
 LOOKAHEAD_DAYS = int(os.getenv("LOOKAHEAD_DAYS", "7"))
 MAX_SLOTS = int(os.getenv("MAX_SLOTS", "6"))
+# Per-weekday hours, breaks, holidays and closures compiled once (see app/schedule.py)
+WORKING_RULES = schedule.load_rules(TIMEZONE, WORK_START_HOUR, WORK_END_HOUR)
+# Meta redelivers webhooks it thinks failed; remember message ids this long
+DEDUPE_TTL_SECONDS = int(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
 
 
 # --- Helpers ---
@@ -57,6 +67,13 @@ def _as_tz(dt: datetime.datetime) -> datetime.datetime:
 @app.on_event("startup")
 def _startup() -> None:
     db.init_db()
+    if reminders.REMINDERS_ENABLED:
+        reminders.scheduler.start()
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    reminders.scheduler.stop()
 
 
 @app.get("/health/live")
@@ -74,27 +91,74 @@ async def health_ready(session: Session = Depends(db.get_session)) -> Dict[str,
         raise HTTPException(status_code=503, detail="not ready")
 
 
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, int]:
+    return metrics.snapshot()
+
+
 def _send_menu(to: str) -> None:
     wa_client.send_buttons(
         to=to,
         prompt="Welcome to Edna Hairdresser! What would you like to do?",
         buttons=[
             {"id": "menu_book", "title": "Book appointment"},
+            {"id": "menu_mine", "title": "My appointments"},
             {"id": "menu_help", "title": "Help"},
         ],
     )
 
 
-def _send_slots(to: str, contact_name: Optional[str]) -> Optional[List[datetime.datetime]]:
+def _service_or_default(service_id: Optional[str]) -> services.Service:
+    return services.get_service(service_id) or services.Service("default", "Appointment", SLOT_MINUTES)
+
+
+def _send_services(to: str, contact_name: Optional[str]) -> None:
+    if len(services.CATALOG) <= 1:
+        _send_slots(to, contact_name, _service_or_default(next(iter(services.CATALOG), None)))
+        return
+    buttons = [
+        {"id": f"service::{service.id}", "title": f"{service.title} ({service.duration_minutes}m)"}
+        for service in services.CATALOG.values()
+    ]
+    if len(buttons) <= wa_client.MAX_BUTTONS and all(
+        len(b["title"]) <= wa_client.MAX_BUTTON_TITLE_CHARS for b in buttons
+    ):
+        wa_client.send_buttons(to=to, prompt="Which service would you like?", buttons=buttons)
+        return
+    # Too many (or too long) for reply buttons, which would silently drop or cut them
+    wa_client.send_list(
+        to=to,
+        prompt="Which service would you like?",
+        button="Choose service",
+        rows=[
+            {"id": f"service::{service.id}", "title": service.title, "description": f"{service.duration_minutes} min"}
+            for service in services.CATALOG.values()
+        ],
+    )
+
+
+def _send_slots(
+    to: str,
+    contact_name: Optional[str],
+    service: services.Service,
+    slot_id_prefix: Optional[str] = None,
+) -> Optional[List[datetime.datetime]]:
     try:
-        slots = cal.find_next_slots(
-            tz=TIMEZONE,
-            work_start_hour=WORK_START_HOUR,
-            work_end_hour=WORK_END_HOUR,
-            slot_minutes=SLOT_MINUTES,
-            lookahead_days=LOOKAHEAD_DAYS,
-            max_slots=MAX_SLOTS,
-        )
+        with ratelimit.slot_search_cap.hold():
+            slots = cal.find_next_slots(
+                tz=TIMEZONE,
+                work_start_hour=WORK_START_HOUR,
+                work_end_hour=WORK_END_HOUR,
+                slot_minutes=service.total_minutes,
+                lookahead_days=LOOKAHEAD_DAYS,
+                max_slots=MAX_SLOTS,
+                rules=WORKING_RULES,
+                step_minutes=SLOT_STEP_MINUTES,
+                min_fragment_minutes=services.min_total_minutes(),
+            )
+    except ratelimit.Overloaded:
+        wa_client.send_text(to, ratelimit.BUSY_REPLY)
+        return None
     except Exception as exc:
         logger.exception("Failed to compute slots: %s", exc)
         wa_client.send_text(to, "Sorry, I couldn't load available times right now. Please try again soon.")
@@ -108,12 +172,13 @@ def _send_slots(to: str, contact_name: Optional[str]) -> Optional[List[datetime.
         return None
 
     human = contact_name or "there"
+    prefix = slot_id_prefix or f"slot::{service.id}"
     wa_client.send_buttons(
         to=to,
         prompt=f"Hi {human}, pick a time that works for you:",
         buttons=[
             {
-                "id": f"slot::{slot.isoformat()}",
+                "id": f"{prefix}::{slot.isoformat()}",
                 "title": slot.astimezone(TIMEZONE).strftime("%a %d/%m %H:%M"),
             }
             for slot in slots[:3]
@@ -122,12 +187,12 @@ def _send_slots(to: str, contact_name: Optional[str]) -> Optional[List[datetime.
     return slots
 
 
-def _send_confirmation(to: str, slot: datetime.datetime, note: Optional[str]) -> None:
+def _send_confirmation(to: str, slot: datetime.datetime, note: Optional[str], service: services.Service) -> None:
     display = slot.astimezone(TIMEZONE).strftime("%A %d/%m at %H:%M")
     text_note = f"\nNotes: {note}" if note else ""
     wa_client.send_buttons(
         to=to,
-        prompt=f"Confirm appointment on {display}?{text_note}",
+        prompt=f"Confirm appointment on {display}?\nService: {service.title}{text_note}",
         buttons=[
             {"id": f"confirm::{slot.isoformat()}", "title": "✅ Confirm"},
             {"id": "cancel_flow", "title": "❌ Cancel"},
@@ -149,6 +214,45 @@ def _notify_edna(user_phone: str, contact_name: Optional[str], slot: datetime.da
     )
 
 
+def _notify_edna_change(user_phone: str, contact_name: Optional[str], change: str) -> None:
+    if not EDNA_CONTROL_PHONE:
+        return
+    wa_client.send_text(
+        EDNA_CONTROL_PHONE,
+        f"Appointment changed by client:\n"
+        f"Client: {contact_name or 'Unknown'}\n"
+        f"Phone: {user_phone}\n"
+        f"{change}",
+    )
+
+
+def _send_my_appointments(to: str, session: Session) -> str:
+    upcoming = appointments.upcoming(session, to)
+    if not upcoming:
+        wa_client.send_text(to, "You have no upcoming appointments.")
+        _send_menu(to)
+        return "no_appointments"
+    wa_client.send_buttons(
+        to=to,
+        prompt="Your upcoming appointments. Pick one to cancel or reschedule:",
+        buttons=[
+            {
+                "id": f"appt::{appointment.id}",
+                "title": appointments.start_of(appointment, TIMEZONE).strftime("%a %d/%m %H:%M"),
+            }
+            for appointment in upcoming
+        ],
+    )
+    return "appointments_sent"
+
+
+def _owned_appointment(session: Session, sender: str, btn_id: str, prefix: str):
+    ref = btn_id.split(prefix, maxsplit=1)[1].split("::", maxsplit=1)[0]
+    if not ref.isdigit():
+        return None
+    return appointments.get_owned(session, int(ref), sender)
+
+
 # --- Routes ---
 @app.get("/webhook")
 async def verify_webhook(mode: str = "", hub_verify_token: str = "", hub_challenge: str = ""):
@@ -160,48 +264,82 @@ async def verify_webhook(mode: str = "", hub_verify_token: str = "", hub_challen
 
 @app.post("/webhook")
 async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_session)) -> Dict[str, Any]:
-    payload = await request.json()
-    logger.debug("Incoming payload: %s", payload)
-
-    entry = (
-        payload.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-    )
+    raw = await request.body()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Incoming payload: %s", logging_setup.Truncated(raw))
+    try:
+        message = payload.parse_webhook(raw)
+    except payload.InvalidPayload:
+        raise HTTPException(status_code=400, detail="invalid JSON")
 
-    if "messages" not in entry:
+    if message is None:
         return {"status": "ignored"}
 
-    message = entry["messages"][0]
-    sender = message.get("from")
-    contact_name = None
-    contacts = entry.get("contacts", [])
-    if contacts:
-        contact_name = contacts[0].get("profile", {}).get("name")
+    # Handlers block on Calendar/WhatsApp I/O and backoff sleeps; keep them off the event loop
+    return await run_in_threadpool(_process_message, message, session)
 
-    if not sender:
-        return {"status": "ignored"}
 
-    msg_type = message.get("type")
+def _process_message(message: payload.InboundMessage, session: Session) -> Dict[str, Any]:
+    dedupe_key = f"dedupe:{message.message_id}" if message.message_id else None
+    if dedupe_key and not backend.current.set_if_absent(dedupe_key, "1", ttl_seconds=DEDUPE_TTL_SECONDS):
+        metrics.incr("webhook_duplicates")
+        return {"status": "duplicate"}
+
+    try:
+        # Replies are collected and flushed together, so e.g. text + menu is one API call
+        with wa_client.batch():
+            return _handle_message(message, session)
+    except Exception:
+        # Meta redelivers after a 500; that retry must be handled, not dropped as a duplicate
+        if dedupe_key:
+            backend.current.delete(dedupe_key)
+        raise
+
+
+def _handle_message(message: payload.InboundMessage, session: Session) -> Dict[str, Any]:
+    sender = message.sender
+    contact_name = message.contact_name
+
+    # Throttle before any handler so spam can't trigger Calendar/WhatsApp calls
+    if not ratelimit.limiter.check(sender).allowed:
+        if ratelimit.limiter.should_notify(sender):
+            wa_client.send_text(sender, ratelimit.THROTTLE_REPLY)
+        return {"status": "throttled"}
+
+    msg_type = message.msg_type
 
     # Handle interactive button replies
     if msg_type == "interactive":
-        button = message.get("interactive", {}).get("button_reply", {})
-        btn_id = button.get("id")
+        btn_id = message.button_id
 
         if not btn_id:
             return {"status": "ignored"}
 
         if btn_id == "menu_book":
-            _send_slots(sender, contact_name)
+            _send_services(sender, contact_name)
             return {"status": "menu_sent"}
 
+        if btn_id.startswith("service::"):
+            service = services.get_service(btn_id.split("service::", maxsplit=1)[1])
+            if not service:
+                wa_client.send_text(sender, "Sorry, that service is no longer available.")
+                _send_services(sender, contact_name)
+                return {"status": "unknown_service"}
+            _send_slots(sender, contact_name, service)
+            return {"status": "slots_sent"}
+
         if btn_id == "menu_help":
-            wa_client.send_text(sender, "To book, choose 'Book appointment' and pick a time.")
+            wa_client.send_text(
+                sender,
+                "To book, choose 'Book appointment' and pick a time. "
+                "To cancel or move a booking, choose 'My appointments'.",
+            )
             return {"status": "help_sent"}
 
         if btn_id.startswith("slot::"):
-            iso_time = btn_id.split("slot::", maxsplit=1)[1]
+            slot_ref = btn_id.split("slot::", maxsplit=1)[1]
+            # "slot::<service>::<iso>"; older buttons carry only the ISO time
+            service_id, _, iso_time = slot_ref.rpartition("::")
             try:
                 slot_dt = datetime.datetime.fromisoformat(iso_time)
                 slot_dt = _as_tz(slot_dt)
@@ -210,7 +348,7 @@ async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_s
                 return {"status": "invalid_slot"}
 
             # Save pending slot and ask for notes
-            state.set_pending_slot(session, sender, slot_dt, contact_name, TIMEZONE)
+            state.set_pending_slot(session, sender, slot_dt, contact_name, TIMEZONE, service_id=service_id or None)
             display = slot_dt.astimezone(TIMEZONE).strftime("%A %d/%m at %H:%M")
             wa_client.send_text(
                 sender,
@@ -233,22 +371,45 @@ async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_s
                 _send_menu(sender)
                 return {"status": "stale_pending"}
 
-            if not cal.is_slot_free(slot_dt, duration_minutes=SLOT_MINUTES, tz=TIMEZONE):
-                wa_client.send_text(sender, "Sorry, that slot was just taken. Please pick another time.")
-                _send_slots(sender, contact_name)
-                state.clear(session, sender)
-                return {"status": "slot_busy"}
-
-            event = cal.create_appointment(
-                summary="Hair appointment",
-                start_time=slot_dt,
-                duration_minutes=SLOT_MINUTES,
-                user_phone=sender,
-                contact_name=contact_name,
-                note=pending.note,
-                tz=TIMEZONE,
-            )
-
+            service = _service_or_default(pending.service_id)
+            try:
+                with ratelimit.booking_cap.hold():
+                    if not cal.is_slot_free(slot_dt, duration_minutes=service.total_minutes, tz=TIMEZONE):
+                        wa_client.send_text(sender, "Sorry, that slot was just taken. Please pick another time.")
+                        _send_slots(sender, contact_name, service)
+                        state.clear(session, sender)
+                        return {"status": "slot_busy"}
+
+                    event = cal.create_appointment(
+                        summary=f"Hair appointment - {service.title}",
+                        start_time=slot_dt,
+                        duration_minutes=service.total_minutes,
+                        user_phone=sender,
+                        contact_name=contact_name,
+                        note=pending.note,
+                        tz=TIMEZONE,
+                    )
+            except ratelimit.Overloaded:
+                # Keep the pending slot so the user can simply press Confirm again
+                wa_client.send_text(sender, ratelimit.BUSY_REPLY)
+                return {"status": "busy"}
+            except google_api.CircuitOpenError:
+                wa_client.send_text(
+                    sender,
+                    "Our calendar is temporarily unavailable. Please press Confirm again in a few minutes.",
+                )
+                return {"status": "calendar_unavailable"}
+            except Exception as exc:
+                # Retries exhausted (quota blip, timeouts); the pending slot is kept for another try
+                logger.exception("Failed to book %s for %s: %s", slot_dt.isoformat(), sender, exc)
+                wa_client.send_text(
+                    sender,
+                    "Sorry, I couldn't book that right now. Please press Confirm again in a minute.",
+                )
+                return {"status": "booking_failed"}
+
+            appointments.record(session, sender, event.get("id"), slot_dt, service.total_minutes, pending.service_id)
+            reminders.schedule_for_appointment(session, sender, slot_dt, event.get("id"))
             wa_client.send_text(
                 sender,
                 f"Confirmed! See you then.\nCalendar link: {event.get('htmlLink', 'created')}",
@@ -257,6 +418,82 @@ async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_s
             state.clear(session, sender)
             return {"status": "confirmed"}
 
+        if btn_id == "menu_mine":
+            return {"status": _send_my_appointments(sender, session)}
+
+        if btn_id.startswith(("appt::", "cancel_appt::", "resched::", "reslot::")):
+            prefix = btn_id.split("::", maxsplit=1)[0] + "::"
+            appointment = _owned_appointment(session, sender, btn_id, prefix)
+            if not appointment:
+                wa_client.send_text(sender, "That appointment is no longer active.")
+                _send_my_appointments(sender, session)
+                return {"status": "appointment_missing"}
+            display = appointments.start_of(appointment, TIMEZONE).strftime("%A %d/%m at %H:%M")
+
+            if prefix == "appt::":
+                wa_client.send_buttons(
+                    to=sender,
+                    prompt=f"Your appointment on {display}. What would you like to do?",
+                    buttons=[
+                        {"id": f"resched::{appointment.id}", "title": "Reschedule"},
+                        {"id": f"cancel_appt::{appointment.id}", "title": "Cancel it"},
+                        {"id": "menu_mine", "title": "Back"},
+                    ],
+                )
+                return {"status": "appointment_options"}
+
+            if prefix == "resched::":
+                service = _service_or_default(appointment.service_id)
+                service = services.Service(service.id, service.title, appointment.duration_minutes)
+                _send_slots(sender, contact_name, service, slot_id_prefix=f"reslot::{appointment.id}")
+                return {"status": "slots_sent"}
+
+            try:
+                with ratelimit.booking_cap.hold():
+                    if prefix == "cancel_appt::":
+                        appointments.cancel(session, appointment)
+                        wa_client.send_text(sender, f"Your appointment on {display} is cancelled.")
+                        _notify_edna_change(sender, contact_name, f"Cancelled: {display}")
+                        return {"status": "appointment_cancelled"}
+
+                    # reslot::<id>::<iso>
+                    try:
+                        new_start = _as_tz(datetime.datetime.fromisoformat(btn_id.rsplit("::", maxsplit=1)[1]))
+                    except Exception:
+                        wa_client.send_text(sender, "Could not parse that slot. Please try again.")
+                        return {"status": "invalid_slot"}
+                    # Slot buttons stay tappable forever; the time may have passed or the rules changed
+                    earliest = datetime.datetime.now(tz=TIMEZONE) + datetime.timedelta(minutes=cal.LEAD_TIME_MINUTES)
+                    if new_start < earliest or not WORKING_RULES.covers(new_start, appointment.duration_minutes):
+                        wa_client.send_text(sender, "Sorry, that time is no longer available. Please pick again.")
+                        return {"status": "slot_unavailable"}
+                    if not appointments.can_move_to(appointment, new_start):
+                        wa_client.send_text(sender, "Sorry, that slot was just taken. Please pick another time.")
+                        return {"status": "slot_busy"}
+                    appointments.reschedule(session, appointment, new_start, TIMEZONE)
+            except ratelimit.Overloaded:
+                wa_client.send_text(sender, ratelimit.BUSY_REPLY)
+                return {"status": "busy"}
+            except google_api.CircuitOpenError:
+                wa_client.send_text(
+                    sender,
+                    "Our calendar is temporarily unavailable. Please try again in a few minutes.",
+                )
+                return {"status": "calendar_unavailable"}
+            except cal.EventNotFound:
+                # Edna removed it from the calendar; the local row is now cancelled too
+                wa_client.send_text(sender, f"Your appointment on {display} was already cancelled by the salon.")
+                return {"status": "appointment_gone"}
+            except Exception as exc:
+                logger.exception("Failed to change appointment %s for %s: %s", appointment.id, sender, exc)
+                wa_client.send_text(sender, "Sorry, I couldn't update your appointment right now. Please try again.")
+                return {"status": "calendar_error"}
+
+            new_display = new_start.astimezone(TIMEZONE).strftime("%A %d/%m at %H:%M")
+            wa_client.send_text(sender, f"Done! Your appointment moved from {display} to {new_display}.")
+            _notify_edna_change(sender, contact_name, f"Rescheduled: {display} -> {new_display}")
+            return {"status": "appointment_rescheduled"}
+
         if btn_id == "cancel_flow":
             state.clear(session, sender)
             wa_client.send_text(sender, "Booking cancelled. You can start again anytime.")
@@ -267,7 +504,7 @@ async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_s
 
     # Handle plain text messages
     if msg_type == "text":
-        text_body = message.get("text", {}).get("body", "").strip()
+        text_body = message.text_body.strip()
         pending = state.get_pending(session, sender, TIMEZONE)
 
         if pending and pending.step == "awaiting_note":
@@ -277,10 +514,13 @@ async def whatsapp_webhook(request: Request, session: Session = Depends(db.get_s
                 wa_client.send_text(sender, "Your session expired. Please pick a time again.")
                 _send_menu(sender)
                 return {"status": "pending_missing"}
-            _send_confirmation(sender, pending.slot, note)
+            _send_confirmation(sender, pending.slot, note, _service_or_default(pending.service_id))
             return {"status": "note_recorded"}
 
         lowered = text_body.lower()
+        if "my appointment" in lowered or lowered in ("cancel", "reschedule"):
+            return {"status": _send_my_appointments(sender, session)}
+
         if "book" in lowered or "appointment" in lowered or "hair" in lowered:
             _send_menu(sender)
             return {"status": "menu_sent"}
@@ -0,0 +1,23 @@
+import threading
+from collections import Counter
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Counter = Counter()
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Increment a named process-local counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot() -> Dict[str, int]:
+    """Return a copy of all counters (served by GET /metrics)."""
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
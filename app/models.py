@@ -1,7 +1,7 @@
 import datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Column, DateTime, Index, Integer, String
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -14,6 +14,7 @@ class PendingState(Base):
     slot_iso = Column(String(64), nullable=False)  # store ISO string to avoid tz loss in some DBs
     contact_name = Column(String(128), nullable=True)
     note = Column(String(512), nullable=True)
+    service_id = Column(String(32), nullable=True)
     step = Column(String(32), nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
@@ -24,7 +25,38 @@ class PendingState(Base):
             "slot_iso": self.slot_iso,
             "contact_name": self.contact_name,
             "note": self.note,
+            "service_id": self.service_id,
             "step": self.step,
             "expires_at": self.expires_at,
             "created_at": self.created_at,
         }
+
+
+class ReminderJob(Base):
+    __tablename__ = "reminder_jobs"
+    __table_args__ = (Index("ix_reminder_jobs_status_remind_at", "status", "remind_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    phone = Column(String(32), nullable=False)
+    event_id = Column(String(128), nullable=True, index=True)
+    appointment_at = Column(DateTime(timezone=True), nullable=False)  # stored as UTC
+    remind_at = Column(DateTime(timezone=True), nullable=False)  # stored as UTC
+    status = Column(String(16), nullable=False, default="pending")  # pending/sending/sent/skipped/cancelled
+    claimed_at = Column(DateTime(timezone=True), nullable=True)  # when a worker moved it to "sending"
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+
+
+class Appointment(Base):
+    __tablename__ = "appointments"
+    __table_args__ = (Index("ix_appointments_phone_start_at", "phone", "start_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    phone = Column(String(32), nullable=False)
+    event_id = Column(String(128), nullable=True, index=True)
+    service_id = Column(String(32), nullable=True)
+    start_at = Column(DateTime(timezone=True), nullable=False, index=True)  # stored as UTC
+    duration_minutes = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False, default="booked")  # booked/cancelled
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -0,0 +1,67 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+
+    _loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:  # pragma: no cover - orjson is in requirements, json is the fallback
+    orjson = None
+    _loads = json.loads
+
+
+class InvalidPayload(ValueError):
+    """Webhook body is not valid JSON."""
+
+
+@dataclass(frozen=True, slots=True)
+class InboundMessage:
+    """The few fields of a WhatsApp webhook the bot actually uses."""
+
+    sender: str
+    message_id: Optional[str]
+    msg_type: Optional[str]
+    contact_name: Optional[str]
+    text_body: str = ""
+    button_id: Optional[str] = None  # id of the reply button or list row picked
+
+
+def parse_webhook(raw: bytes) -> Optional[InboundMessage]:
+    """Parse a webhook body; returns None for callbacks without a user message (e.g. statuses)."""
+    try:
+        payload = _loads(raw)
+    except ValueError as exc:  # orjson.JSONDecodeError subclasses ValueError
+        raise InvalidPayload(str(exc)) from exc
+
+    try:
+        value = payload["entry"][0]["changes"][0]["value"]
+        message = value["messages"][0]
+        sender = message["from"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if not sender:
+        return None
+
+    contact_name = None
+    contacts = value.get("contacts")
+    if contacts:
+        contact_name = (contacts[0].get("profile") or {}).get("name")
+
+    msg_type = message.get("type")
+    text_body = ""
+    button_id = None
+    if msg_type == "text":
+        text_body = (message.get("text") or {}).get("body") or ""
+    elif msg_type == "interactive":
+        interactive = message.get("interactive") or {}
+        button_id = (interactive.get("button_reply") or interactive.get("list_reply") or {}).get("id")
+
+    return InboundMessage(
+        sender=sender,
+        message_id=message.get("id"),
+        msg_type=msg_type,
+        contact_name=contact_name,
+        text_body=text_body,
+        button_id=button_id,
+    )
@@ -0,0 +1,131 @@
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional, Protocol
+
+from app import backend
+from app import metrics
+
+# Token bucket per sender: short bursts are fine, sustained spam is not.
+RATE_LIMIT_CAPACITY = float(os.getenv("RATE_LIMIT_CAPACITY", "6"))
+RATE_LIMIT_REFILL_PER_SEC = float(os.getenv("RATE_LIMIT_REFILL_PER_SEC", "0.2"))
+# Only one "please wait" reply per sender within this window.
+RATE_LIMIT_NOTICE_SECONDS = float(os.getenv("RATE_LIMIT_NOTICE_SECONDS", "60"))
+
+# Global caps on expensive operations (Calendar searches / bookings), shared by
+# every worker pointing at the same app.backend.
+MAX_CONCURRENT_SLOT_SEARCHES = int(os.getenv("MAX_CONCURRENT_SLOT_SEARCHES", "4"))
+MAX_CONCURRENT_BOOKINGS = int(os.getenv("MAX_CONCURRENT_BOOKINGS", "2"))
+CONCURRENCY_WAIT_SECONDS = float(os.getenv("CONCURRENCY_WAIT_SECONDS", "2"))
+# A holder that crashed frees its slot after this long
+CONCURRENCY_LEASE_SECONDS = float(os.getenv("CONCURRENCY_LEASE_SECONDS", "60"))
+CONCURRENCY_POLL_SECONDS = 0.05
+
+THROTTLE_REPLY = "You're sending messages a bit fast. Please wait a moment and try again."
+BUSY_REPLY = "We're a little busy right now. Please try again in a minute."
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+
+
+class BucketStore(Protocol):
+    def take(self, key: str, capacity: float, refill_rate: float, cost: float, now: Optional[float] = None) -> float:
+        """Consume ``cost`` tokens; return 0 when allowed, else seconds until allowed."""
+
+    def set_if_absent(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> bool:
+        ...
+
+    def acquire_lease(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        ...
+
+    def release_lease(self, key: str, token: str) -> None:
+        ...
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        capacity: float = RATE_LIMIT_CAPACITY,
+        refill_rate: float = RATE_LIMIT_REFILL_PER_SEC,
+        store: Optional[BucketStore] = None,
+        notice_seconds: float = RATE_LIMIT_NOTICE_SECONDS,
+    ) -> None:
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        # None means "whatever app.backend is configured with", resolved per call
+        self._store = store
+        self.notice_seconds = notice_seconds
+
+    @property
+    def store(self) -> BucketStore:
+        return self._store or backend.current
+
+    def check(self, key: str, cost: float = 1.0) -> Decision:
+        retry_after = self.store.take(f"ratelimit:{key}", self.capacity, self.refill_rate, cost)
+        if retry_after > 0:
+            metrics.incr("ratelimit_throttled")
+            return Decision(allowed=False, retry_after=retry_after)
+        return Decision(allowed=True)
+
+    def should_notify(self, key: str) -> bool:
+        """True at most once per notice window, so throttled spam stays silent."""
+        if self.store.set_if_absent(f"ratelimit_notice:{key}", "1", ttl_seconds=self.notice_seconds):
+            return True
+        metrics.incr("ratelimit_notice_suppressed")
+        return False
+
+
+class Overloaded(Exception):
+    """Raised when a concurrency cap cannot be acquired in time."""
+
+
+class ConcurrencyCap:
+    """At most ``limit`` holders at once across all workers sharing the store.
+
+    Slots are leases in the backend, so a crashed holder cannot leak one for
+    longer than ``lease_seconds``. Waiting polls; handlers run in the threadpool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        wait_seconds: float = CONCURRENCY_WAIT_SECONDS,
+        lease_seconds: float = CONCURRENCY_LEASE_SECONDS,
+        store: Optional[BucketStore] = None,
+    ) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.wait_seconds = wait_seconds
+        self.lease_seconds = lease_seconds
+        self._store = store
+
+    @property
+    def store(self) -> BucketStore:
+        return self._store or backend.current
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        store = self.store
+        key = f"concurrency:{self.name}"
+        deadline = time.monotonic() + self.wait_seconds
+        token = store.acquire_lease(key, self.limit, self.lease_seconds)
+        while token is None:
+            if time.monotonic() >= deadline:
+                metrics.incr(f"overloaded_{self.name}")
+                raise Overloaded(self.name)
+            time.sleep(CONCURRENCY_POLL_SECONDS)
+            token = store.acquire_lease(key, self.limit, self.lease_seconds)
+        try:
+            yield
+        finally:
+            store.release_lease(key, token)
+
+
+limiter = RateLimiter()
+slot_search_cap = ConcurrencyCap("slot_search", MAX_CONCURRENT_SLOT_SEARCHES)
+booking_cap = ConcurrencyCap("booking", MAX_CONCURRENT_BOOKINGS)
@@ -0,0 +1,262 @@
+import datetime
+import heapq
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app import metrics
+from app import wa_client
+from app.models import ReminderJob
+
+logger = logging.getLogger(__name__)
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "true").lower() in ("1", "true", "yes")
+REMINDER_OFFSETS_HOURS = [float(h) for h in os.getenv("REMINDER_OFFSETS_HOURS", "24,2").split(",") if h.strip()]
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "20"))
+REMINDER_SEND_INTERVAL_SECONDS = float(os.getenv("REMINDER_SEND_INTERVAL_SECONDS", "0.5"))
+# Jobs inserted by other workers are picked up by a cheap indexed query this often
+REMINDER_REFRESH_SECONDS = float(os.getenv("REMINDER_REFRESH_SECONDS", "300"))
+# A job left in "sending" this long (worker died mid-send) is handed out again
+REMINDER_CLAIM_TIMEOUT_SECONDS = float(os.getenv("REMINDER_CLAIM_TIMEOUT_SECONDS", "600"))
+REMINDER_RETRY_MINUTES = 5
+TIMEZONE = ZoneInfo(os.getenv("TZ", "Asia/Jerusalem"))
+
+UTC = datetime.timezone.utc
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=UTC)
+
+
+def as_utc(dt: datetime.datetime) -> datetime.datetime:
+    # SQLite drops tzinfo; values are always written as UTC
+    return dt.replace(tzinfo=UTC) if dt.tzinfo is None else dt.astimezone(UTC)
+
+
+def schedule_for_appointment(
+    session: Session,
+    user_phone: str,
+    start_time: datetime.datetime,
+    event_id: Optional[str],
+) -> List[ReminderJob]:
+    """Persist reminder jobs for a new appointment; the scheduler sees them once committed."""
+    start = as_utc(start_time)
+    now = _utcnow()
+    jobs = []
+    for hours in REMINDER_OFFSETS_HOURS:
+        remind_at = start - datetime.timedelta(hours=hours)
+        if remind_at <= now:
+            continue
+        job = ReminderJob(
+            phone=user_phone,
+            event_id=event_id,
+            appointment_at=start,
+            remind_at=remind_at,
+            status="pending",
+        )
+        session.add(job)
+        jobs.append(job)
+    if jobs:
+        session.flush()  # assign ids
+        # Queued on commit: before that the claim UPDATE of the worker thread cannot see the rows
+        session.info.setdefault("reminder_jobs", []).extend((job.id, job.remind_at) for job in jobs)
+    return jobs
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session: Session) -> None:
+    for job_id, remind_at in session.info.pop("reminder_jobs", ()):
+        scheduler.add(job_id, remind_at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("reminder_jobs", None)
+
+
+def cancel_for_event(session: Session, event_id: Optional[str]) -> int:
+    """Cancel pending reminders of an event; queued heap entries are skipped when due."""
+    if not event_id:
+        return 0
+    return session.execute(
+        update(ReminderJob)
+        .where(ReminderJob.event_id == event_id, ReminderJob.status == "pending")
+        .values(status="cancelled")
+    ).rowcount
+
+
+def _reminder_text(appointment_at: datetime.datetime) -> str:
+    display = as_utc(appointment_at).astimezone(TIMEZONE).strftime("%A %d/%m at %H:%M")
+    return f"Reminder: your appointment at Edna Hairdresser is on {display}. See you then!"
+
+
+class ReminderScheduler:
+    """Min-heap of (remind_at, job_id) backed by the reminder_jobs table.
+
+    The worker thread sleeps until the earliest due time (or a new earlier job
+    arrives), then claims and sends due jobs in throttled batches. Claiming is a
+    conditional UPDATE, so several workers can share one table without sending
+    the same reminder twice. On restart only pending rows are reloaded, plus
+    rows stuck in "sending" longer than ``claim_timeout`` (their worker died).
+    """
+
+    def __init__(
+        self,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        send_interval: float = REMINDER_SEND_INTERVAL_SECONDS,
+        refresh_seconds: float = REMINDER_REFRESH_SECONDS,
+        claim_timeout: float = REMINDER_CLAIM_TIMEOUT_SECONDS,
+        clock: Callable[[], datetime.datetime] = _utcnow,
+    ) -> None:
+        self.batch_size = batch_size
+        self.send_interval = send_interval
+        self.refresh_seconds = refresh_seconds
+        self.claim_timeout = claim_timeout
+        self.clock = clock
+        self._heap: List[Tuple[datetime.datetime, int]] = []
+        self._queued: Set[int] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def add(self, job_id: int, remind_at: datetime.datetime) -> None:
+        with self._cond:
+            if job_id in self._queued:
+                return
+            remind_at = as_utc(remind_at)
+            wake = not self._heap or remind_at < self._heap[0][0]
+            heapq.heappush(self._heap, (remind_at, job_id))
+            self._queued.add(job_id)
+            if wake:
+                self._cond.notify()
+
+    def load_pending(self) -> int:
+        """Queue every pending job from the table; returns how many were new."""
+        stale_claim = self.clock() - datetime.timedelta(seconds=self.claim_timeout)
+        with db.session_scope() as session:
+            session.execute(
+                update(ReminderJob)
+                .where(
+                    ReminderJob.status == "sending",
+                    or_(ReminderJob.claimed_at.is_(None), ReminderJob.claimed_at < stale_claim),
+                )
+                .values(status="pending")
+            )
+            rows = session.execute(
+                select(ReminderJob.id, ReminderJob.remind_at).where(ReminderJob.status == "pending")
+            ).all()
+        before = len(self._queued)
+        for job_id, remind_at in rows:
+            self.add(job_id, remind_at)
+        return len(self._queued) - before
+
+    def next_due(self) -> Optional[datetime.datetime]:
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: datetime.datetime) -> List[int]:
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                _, job_id = heapq.heappop(self._heap)
+                self._queued.discard(job_id)
+                due.append(job_id)
+        return due
+
+    def run_due(self) -> int:
+        """Send one batch of due reminders; returns how many were sent."""
+        now = self.clock()
+        sent = 0
+        for index, job_id in enumerate(self._pop_due(now)):
+            if index and self.send_interval:
+                time.sleep(self.send_interval)
+            if self._send_one(job_id, now):
+                sent += 1
+        return sent
+
+    def _send_one(self, job_id: int, now: datetime.datetime) -> bool:
+        with db.session_scope() as session:
+            claimed = session.execute(
+                update(ReminderJob)
+                .where(ReminderJob.id == job_id, ReminderJob.status == "pending")
+                .values(status="sending", claimed_at=now)
+            ).rowcount
+            if not claimed:
+                return False  # cancelled, rolled back or taken by another worker
+            job = session.get(ReminderJob, job_id)
+            phone, appointment_at = job.phone, job.appointment_at
+
+        if as_utc(appointment_at) <= now:
+            status = "skipped"  # we were down past the appointment itself
+        else:
+            try:
+                delivered = wa_client.send_text(phone, _reminder_text(appointment_at))
+            except Exception as exc:
+                logger.exception("Reminder %s failed: %s", job_id, exc)
+                delivered = False
+            status = "sent" if delivered else "pending"
+
+        with db.session_scope() as session:
+            session.execute(
+                update(ReminderJob)
+                .where(ReminderJob.id == job_id)
+                .values(status=status, sent_at=now if status == "sent" else None)
+            )
+        if status == "pending":
+            self.add(job_id, now + datetime.timedelta(minutes=REMINDER_RETRY_MINUTES))
+        metrics.incr(f"reminders_{status}")
+        return status == "sent"
+
+    def _loop(self) -> None:
+        last_refresh = time.monotonic()
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                due = self._heap[0][0] if self._heap else None
+                timeout = self.refresh_seconds
+                if due is not None:
+                    timeout = min(timeout, max(0.0, (due - self.clock()).total_seconds()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+            try:
+                if time.monotonic() - last_refresh >= self.refresh_seconds:
+                    self.load_pending()
+                    last_refresh = time.monotonic()
+                self.run_due()
+            except Exception as exc:
+                logger.exception("Reminder scheduler iteration failed: %s", exc)
+                time.sleep(1)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self.load_pending()
+        self._thread = threading.Thread(target=self._loop, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def clear(self) -> None:
+        with self._cond:
+            self._heap.clear()
+            self._queued.clear()
+
+
+scheduler = ReminderScheduler()
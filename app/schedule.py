@@ -0,0 +1,298 @@
+import datetime
+import hashlib
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+# Working-hours rules compiled into one minute-resolution bitmap per weekday.
+# Bit ``m`` of a day mask is set when minute ``m`` after local midnight is
+# bookable; Python ints serve as arbitrarily long bitsets, so intersecting a day
+# with its busy intervals or finding room for a slot is a handful of big-int ops.
+
+MINUTES_PER_DAY = 24 * 60
+Interval = Tuple[int, int]  # [start, end) in minutes after midnight
+
+_DAY_NAMES = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+
+def span_mask(start: int, end: int) -> int:
+    """Bitmask with minutes ``start``..``end - 1`` set."""
+    start = max(0, start)
+    end = min(MINUTES_PER_DAY, end)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def fits_mask(mask: int, length: int) -> int:
+    """Bits ``p`` such that minutes ``p``..``p + length - 1`` are all set in ``mask``."""
+    result = mask
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        result &= result >> step
+        covered += step
+    return result
+
+
+def set_bits(mask: int) -> Iterator[int]:
+    """Positions of set bits, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def runs(mask: int) -> List[Interval]:
+    """Maximal runs of set bits as [start, end) intervals."""
+    intervals = []
+    pos = 0
+    while mask:
+        low = (mask & -mask).bit_length() - 1  # first set bit
+        mask >>= low
+        pos += low
+        length = (~mask & (mask + 1)).bit_length() - 1  # trailing ones
+        intervals.append((pos, pos + length))
+        mask >>= length
+        pos += length
+    return intervals
+
+
+@dataclass(frozen=True)
+class WorkingRules:
+    """Human-level schedule: hours per weekday (Mon=0), breaks, holidays and closures."""
+
+    weekly_hours: Dict[int, Tuple[Interval, ...]]
+    breaks: Dict[int, Tuple[Interval, ...]] = field(default_factory=dict)
+    holidays: FrozenSet[datetime.date] = frozenset()
+    closures: Tuple[Tuple[datetime.datetime, datetime.datetime], ...] = ()
+
+
+class CompiledSchedule:
+    """Weekly bitmap template built once from ``WorkingRules`` and reused across requests."""
+
+    def __init__(self, rules: WorkingRules, tz: ZoneInfo) -> None:
+        self.rules = rules
+        self.tz = tz
+        weekly = []
+        for weekday in range(7):
+            mask = 0
+            for start, end in rules.weekly_hours.get(weekday, ()):
+                mask |= span_mask(start, end)
+            for start, end in rules.breaks.get(weekday, ()):
+                mask &= ~span_mask(start, end)
+            weekly.append(mask)
+        self.weekly: Tuple[int, ...] = tuple(weekly)
+        source = (
+            sorted(rules.weekly_hours.items()),
+            sorted(rules.breaks.items()),
+            sorted(rules.holidays),
+            rules.closures,
+            str(tz),
+        )
+        # Identifies this rule set in cache keys shared between workers
+        self.fingerprint = hashlib.sha1(repr(source).encode()).hexdigest()[:12]
+        self._grid = lru_cache(maxsize=64)(self._build_grid)
+
+    def _build_grid(self, weekday: int, step: int) -> int:
+        # Candidate starts every ``step`` minutes from the beginning of each open stretch,
+        # so e.g. slots resume at 13:30 after a 13:00-13:30 lunch break.
+        grid = 0
+        for start, end in runs(self.weekly[weekday]):
+            for minute in range(start, end, step):
+                grid |= 1 << minute
+        return grid
+
+    def grid(self, weekday: int, step: int) -> int:
+        return self._grid(weekday, step)
+
+    def day_mask(self, day: datetime.date) -> int:
+        """Open minutes of ``day`` before busy time is removed."""
+        if day in self.rules.holidays:
+            return 0
+        mask = self.weekly[day.weekday()]
+        if mask and self.rules.closures:
+            mask &= ~self.intervals_mask(day, self.rules.closures)
+        return mask
+
+    def intervals_mask(
+        self,
+        day: datetime.date,
+        intervals: Iterable[Tuple[datetime.datetime, datetime.datetime]],
+    ) -> int:
+        """Minutes of ``day`` covered by any of the (aware) datetime intervals."""
+        midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        next_midnight = midnight + datetime.timedelta(days=1)
+        mask = 0
+        for start, end in intervals:
+            if end <= midnight or start >= next_midnight:
+                continue
+            # Same tzinfo as midnight, so the difference is wall-clock minutes even on DST days
+            start, end = start.astimezone(self.tz), end.astimezone(self.tz)
+            start_min = int((max(start, midnight) - midnight).total_seconds() // 60)
+            end_seconds = (min(end, next_midnight) - midnight).total_seconds()
+            end_min = int(-(-end_seconds // 60))  # a busy block ending 10:00:30 blocks 10:00
+            mask |= span_mask(start_min, end_min)
+        return mask
+
+    def free_mask(
+        self,
+        day: datetime.date,
+        busy: Sequence[Tuple[datetime.datetime, datetime.datetime]],
+        earliest: Optional[datetime.datetime] = None,
+    ) -> int:
+        """Open minutes of ``day`` that are not busy and not before ``earliest``."""
+        mask = self.day_mask(day)
+        if not mask:
+            return 0
+        if busy:
+            mask &= ~self.intervals_mask(day, busy)
+        earliest_min = self._earliest_minute(day, earliest)
+        if earliest_min:
+            mask &= ~span_mask(0, earliest_min)
+        return mask
+
+    def _earliest_minute(self, day: datetime.date, earliest: Optional[datetime.datetime]) -> int:
+        """First whole minute of ``day`` at or after ``earliest`` (0 when it is not on/after ``day``)."""
+        midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        if earliest is None or earliest <= midnight:
+            return 0
+        return -(-int((earliest.astimezone(self.tz) - midnight).total_seconds()) // 60)
+
+    def covers(self, start: datetime.datetime, length: int) -> bool:
+        """True when all ``length`` minutes from ``start`` are open (hours, breaks, holidays, closures)."""
+        local = start.astimezone(self.tz)
+        midnight = datetime.datetime(local.year, local.month, local.day, tzinfo=self.tz)
+        start_min = int((local - midnight).total_seconds() // 60)
+        needed = span_mask(start_min, start_min + length)
+        if start_min + length > MINUTES_PER_DAY or not needed:
+            return False
+        return self.free_mask(local.date(), []) & needed == needed
+
+    def free_starts(
+        self,
+        day: datetime.date,
+        busy: Sequence[Tuple[datetime.datetime, datetime.datetime]],
+        length: int,
+        step: int,
+        earliest: Optional[datetime.datetime] = None,
+    ) -> List[datetime.datetime]:
+        """Grid-aligned start times on ``day`` with ``length`` free minutes."""
+        mask = self.free_mask(day, busy, earliest)
+        starts = fits_mask(mask, length) & self.grid(day.weekday(), step)
+        midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        return [midnight + datetime.timedelta(minutes=start) for start in set_bits(starts)]
+
+    def placements(
+        self,
+        day: datetime.date,
+        busy: Sequence[Tuple[datetime.datetime, datetime.datetime]],
+        length: int,
+        step: int,
+        min_fragment: int,
+        earliest: Optional[datetime.datetime] = None,
+    ) -> List[Tuple[int, int, datetime.datetime]]:
+        """Candidate starts on ``day`` as ``(wasted_minutes, fragments, start)``.
+
+        Candidates are the grid points plus both edges of every free gap long
+        enough for ``length``. A leftover piece shorter than ``min_fragment`` can
+        never be booked, so it counts as waste; sorting by the tuple prefers
+        placements that keep Edna's day in few, usable pieces.
+
+        ``earliest`` (now plus lead time) only removes candidates: a gap it cuts
+        is bookable from its first grid point onwards, so the cut minute is not
+        an edge candidate and the time before that grid point is not a leftover.
+        """
+        mask = self.free_mask(day, busy)
+        if not mask:
+            return []
+        earliest_min = self._earliest_minute(day, earliest)
+        grid = self.grid(day.weekday(), step)
+        midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        result = []
+        for gap_start, gap_end in runs(mask):
+            last = gap_end - length
+            if last < max(gap_start, earliest_min):
+                continue
+            grid_starts = sorted(set_bits(grid & span_mask(max(gap_start, earliest_min), last + 1)))
+            if gap_start >= earliest_min:
+                first = gap_start
+            else:
+                first = grid_starts[0] if grid_starts else last
+            for start in sorted({first, last, *grid_starts}):
+                leftovers = [piece for piece in (start - first, gap_end - start - length) if piece]
+                wasted = sum(piece for piece in leftovers if piece < min_fragment)
+                result.append((wasted, len(leftovers), midnight + datetime.timedelta(minutes=start)))
+        return result
+
+
+# --- Parsing (env configuration) ---
+def _parse_hhmm(value: str) -> int:
+    hours, minutes = value.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _parse_days(spec: str) -> List[int]:
+    days: List[int] = []
+    for part in spec.split(","):
+        part = part.strip().lower()
+        if "-" in part:
+            first, last = (_DAY_NAMES[p.strip()[:3]] for p in part.split("-"))
+            day = first
+            days.append(day)
+            while day != last:
+                day = (day + 1) % 7
+                days.append(day)
+        else:
+            days.append(_DAY_NAMES[part[:3]])
+    return days
+
+
+def parse_day_ranges(spec: str) -> Dict[int, Tuple[Interval, ...]]:
+    """Parse ``"sun-thu=09:00-17:00;fri=09:00-13:00"``; entries without ``days=`` apply daily."""
+    result: Dict[int, List[Interval]] = {}
+    for entry in filter(None, (e.strip() for e in spec.split(";"))):
+        days_spec, _, ranges = entry.rpartition("=")
+        days = _parse_days(days_spec) if days_spec else list(range(7))
+        for rng in ranges.split(","):
+            start, end = rng.split("-")
+            for day in days:
+                result.setdefault(day, []).append((_parse_hhmm(start), _parse_hhmm(end)))
+    return {day: tuple(sorted(intervals)) for day, intervals in result.items()}
+
+
+def parse_holidays(spec: str) -> FrozenSet[datetime.date]:
+    return frozenset(datetime.date.fromisoformat(d.strip()) for d in spec.split(",") if d.strip())
+
+
+def parse_closures(spec: str, tz: ZoneInfo) -> Tuple[Tuple[datetime.datetime, datetime.datetime], ...]:
+    """Parse ``"2025-05-01T12:00/2025-05-01T17:00,..."`` (local time unless an offset is given)."""
+    closures = []
+    for item in filter(None, (c.strip() for c in spec.split(","))):
+        start, end = (datetime.datetime.fromisoformat(part) for part in item.split("/"))
+        closures.append((
+            start if start.tzinfo else start.replace(tzinfo=tz),
+            end if end.tzinfo else end.replace(tzinfo=tz),
+        ))
+    return tuple(closures)
+
+
+def default_rules(work_start_hour: int, work_end_hour: int) -> WorkingRules:
+    """Single daily window, closed Friday/Saturday (Israel weekend)."""
+    window = ((work_start_hour * 60, work_end_hour * 60),)
+    return WorkingRules(weekly_hours={day: window for day in (6, 0, 1, 2, 3)})
+
+
+def load_rules(tz: ZoneInfo, work_start_hour: int, work_end_hour: int) -> CompiledSchedule:
+    """Compile rules from WORK_HOURS / WORK_BREAKS / HOLIDAYS / CLOSURES env vars."""
+    hours_spec = os.getenv("WORK_HOURS", "")
+    base = default_rules(work_start_hour, work_end_hour)
+    rules = WorkingRules(
+        weekly_hours=parse_day_ranges(hours_spec) if hours_spec else base.weekly_hours,
+        breaks=parse_day_ranges(os.getenv("WORK_BREAKS", "")),
+        holidays=parse_holidays(os.getenv("HOLIDAYS", "")),
+        closures=parse_closures(os.getenv("CLOSURES", ""), tz),
+    )
+    return CompiledSchedule(rules, tz)
@@ -0,0 +1,48 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# "id:Title:duration:buffer" entries; buffer is clean-up time blocked after the service
+DEFAULT_SERVICES = "trim:Trim:30:0,cut:Haircut:60:10,color:Color:150:15"
+# Up to 3 services are offered as buttons, more as a WhatsApp list (10 rows max)
+MAX_SERVICES = 10
+MAX_TITLE_CHARS = 24
+
+
+@dataclass(frozen=True)
+class Service:
+    id: str
+    title: str
+    duration_minutes: int
+    buffer_minutes: int = 0
+
+    @property
+    def total_minutes(self) -> int:
+        """Calendar time the booking occupies, buffer included."""
+        return self.duration_minutes + self.buffer_minutes
+
+
+def parse_catalog(spec: str) -> Dict[str, Service]:
+    catalog: Dict[str, Service] = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        parts = entry.split(":")
+        service_id, title, duration = parts[0].strip(), parts[1].strip(), int(parts[2])
+        buffer = int(parts[3]) if len(parts) > 3 else 0
+        if len(title) > MAX_TITLE_CHARS:
+            raise ValueError(f"Service title {title!r} is longer than {MAX_TITLE_CHARS} characters")
+        catalog[service_id] = Service(service_id, title, duration, buffer)
+    if len(catalog) > MAX_SERVICES:
+        raise ValueError(f"WhatsApp can offer at most {MAX_SERVICES} services, got {len(catalog)}")
+    return catalog
+
+
+CATALOG = parse_catalog(os.getenv("SERVICES", DEFAULT_SERVICES))
+
+
+def get_service(service_id: Optional[str]) -> Optional[Service]:
+    return CATALOG.get(service_id) if service_id else None
+
+
+def min_total_minutes() -> int:
+    """Shortest sellable gap; smaller leftovers in Edna's day are wasted."""
+    return min((s.total_minutes for s in CATALOG.values()), default=0)
@@ -1,4 +1,5 @@
 import datetime
+import json
 import os
 from dataclasses import dataclass
 from typing import Optional
@@ -7,6 +8,7 @@ from zoneinfo import ZoneInfo
 from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
+from app import backend
 from app.models import PendingState as PendingStateModel
 
 PENDING_TTL_MINUTES = int(os.getenv("PENDING_TTL_MINUTES", "30"))
@@ -19,13 +21,44 @@ class PendingRecord:
     contact_name: Optional[str]
     note: Optional[str]
     step: str
+    service_id: Optional[str] = None
 
 
 def _now(tz: ZoneInfo) -> datetime.datetime:
     return datetime.datetime.now(tz=tz)
 
 
+# --- Shared backend storage ---
+# With a shared backend configured, pending state lives there (one JSON value per
+# phone, expired by the backend's TTL) so every worker sees the same conversation.
+# The SQLAlchemy table below remains the single-node fallback.
+def _shared_key(user_phone: str) -> str:
+    return f"pending:{user_phone}"
+
+
+def _shared_load(user_phone: str) -> Optional[dict]:
+    raw = backend.current.get(_shared_key(user_phone))
+    return json.loads(raw) if raw else None
+
+
+def _shared_save(data: dict, ttl_minutes: int) -> None:
+    backend.current.set(_shared_key(data["phone"]), json.dumps(data), ttl_seconds=ttl_minutes * 60)
+
+
+def _record_from(data: dict) -> PendingRecord:
+    return PendingRecord(
+        phone=data["phone"],
+        slot=datetime.datetime.fromisoformat(data["slot_iso"]),
+        contact_name=data.get("contact_name"),
+        note=data.get("note"),
+        step=data["step"],
+        service_id=data.get("service_id"),
+    )
+
+
 def cleanup_expired(session: Session, tz: ZoneInfo) -> None:
+    if backend.is_shared():
+        return  # the backend expires keys itself
     now = _now(tz)
     session.execute(delete(PendingStateModel).where(PendingStateModel.expires_at <= now))
 
@@ -37,15 +70,30 @@ def set_pending_slot(
     contact_name: Optional[str],
     tz: ZoneInfo,
     ttl_minutes: Optional[int] = None,
+    service_id: Optional[str] = None,
 ) -> None:
     ttl = ttl_minutes or PENDING_TTL_MINUTES
     expires_at = _now(tz) + datetime.timedelta(minutes=ttl)
     slot_iso = slot.isoformat()
+    if backend.is_shared():
+        _shared_save(
+            {
+                "phone": user_phone,
+                "slot_iso": slot_iso,
+                "contact_name": contact_name,
+                "note": None,
+                "service_id": service_id,
+                "step": "awaiting_note",
+            },
+            ttl,
+        )
+        return
     existing = session.get(PendingStateModel, user_phone)
     if existing:
         existing.slot_iso = slot_iso
         existing.contact_name = contact_name
         existing.note = None
+        existing.service_id = service_id
         existing.step = "awaiting_note"
         existing.expires_at = expires_at
     else:
@@ -54,6 +102,7 @@ def set_pending_slot(
             slot_iso=slot_iso,
             contact_name=contact_name,
             note=None,
+            service_id=service_id,
             step="awaiting_note",
             expires_at=expires_at,
         )
@@ -61,6 +110,14 @@ def set_pending_slot(
 
 
 def set_note(session: Session, user_phone: str, note: Optional[str], tz: ZoneInfo) -> Optional[PendingRecord]:
+    if backend.is_shared():
+        data = _shared_load(user_phone)
+        if not data:
+            return None
+        data["note"] = note
+        data["step"] = "awaiting_confirm"
+        _shared_save(data, PENDING_TTL_MINUTES)
+        return _record_from(data)
     record = session.get(PendingStateModel, user_phone)
     if not record:
         return None
@@ -73,10 +130,20 @@ def set_note(session: Session, user_phone: str, note: Optional[str], tz: ZoneInf
         contact_name=record.contact_name,
         note=record.note,
         step=record.step,
+        service_id=record.service_id,
     )
 
 
 def get_pending(session: Session, user_phone: str, tz: ZoneInfo) -> Optional[PendingRecord]:
+    if backend.is_shared():
+        data = _shared_load(user_phone)
+        if not data:
+            return None
+        try:
+            return _record_from(data)
+        except Exception:
+            clear(session, user_phone)
+            return None
     cleanup_expired(session, tz)
     stmt = select(PendingStateModel).where(PendingStateModel.phone == user_phone)
     result = session.scalars(stmt).first()
@@ -93,8 +160,12 @@ def get_pending(session: Session, user_phone: str, tz: ZoneInfo) -> Optional[Pen
         contact_name=result.contact_name,
         note=result.note,
         step=result.step,
+        service_id=result.service_id,
     )
 
 
 def clear(session: Session, user_phone: str) -> None:
+    if backend.is_shared():
+        backend.current.delete(_shared_key(user_phone))
+        return
     session.execute(delete(PendingStateModel).where(PendingStateModel.phone == user_phone))
@@ -1,10 +1,16 @@
+import copy
 import logging
 import os
 import time
-from typing import Dict, List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
 
 import requests
 
+from app import metrics
+from app.logging_setup import Truncated
+
 logger = logging.getLogger(__name__)
 
 WA_TOKEN = os.getenv("WA_TOKEN", "")
@@ -18,39 +24,59 @@ HEADERS = {
 
 MAX_RETRIES = int(os.getenv("WA_MAX_RETRIES", "3"))
 BACKOFF_SECONDS = float(os.getenv("WA_BACKOFF_SECONDS", "1.5"))
+MAX_BODY_CHARS = 1024  # interactive body limit; text bodies are capped the same way in send_text
+MAX_BUTTONS = 3
+MAX_BUTTON_TITLE_CHARS = 20
+MAX_LIST_ROWS = 10
+
+# Messages queued by the current request while inside ``batch()``
+_outbox: ContextVar[Optional[List[Dict]]] = ContextVar("wa_outbox", default=None)
+
+
+def _post(payload: Dict) -> bool:
+    outbox = _outbox.get()
+    if outbox is not None:
+        outbox.append(payload)
+        return True
+    return _send(payload)
 
 
-def _post(payload: Dict) -> None:
+def _send(payload: Dict) -> bool:
+    """POST one message; True once WhatsApp accepted it, False when it was not delivered."""
     if not WA_TOKEN or not PHONE_ID:
-        logger.warning("WhatsApp credentials missing. Skipping send. Payload=%s", payload)
-        return
+        logger.warning("WhatsApp credentials missing. Skipping send. Payload=%s", Truncated(payload))
+        return False
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             resp = requests.post(API_URL, headers=HEADERS, json=payload, timeout=10)
             if resp.ok:
-                return
+                return True
             is_retryable = resp.status_code >= 500
-            logger.error("WhatsApp send failed (attempt %s): %s %s", attempt, resp.status_code, resp.text)
+            logger.error(
+                "WhatsApp send failed (attempt %s): %s %s", attempt, resp.status_code, Truncated(resp.text)
+            )
             if not is_retryable or attempt == MAX_RETRIES:
-                return
+                return False
         except requests.RequestException as exc:
             logger.error("WhatsApp send exception (attempt %s): %s", attempt, exc)
             if attempt == MAX_RETRIES:
-                return
+                return False
         time.sleep(BACKOFF_SECONDS * attempt)
+    return False
 
 
-def send_text(to: str, text: str) -> None:
+def send_text(to: str, text: str) -> bool:
+    """Send (or queue, inside ``batch()``) a text message; False when delivery failed."""
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
         "type": "text",
         "text": {"body": text[:1024]},
     }
-    _post(payload)
+    return _post(payload)
 
 
-def send_buttons(to: str, prompt: str, buttons: List[Dict[str, str]]) -> None:
+def send_buttons(to: str, prompt: str, buttons: List[Dict[str, str]]) -> bool:
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
@@ -62,11 +88,105 @@ def send_buttons(to: str, prompt: str, buttons: List[Dict[str, str]]) -> None:
                 "buttons": [
                     {
                         "type": "reply",
-                        "reply": {"id": b["id"], "title": b["title"][:20]},
+                        "reply": {"id": b["id"], "title": b["title"][:MAX_BUTTON_TITLE_CHARS]},
                     }
                     for b in buttons
-                ][:3],  # WA supports up to 3 buttons
+                ][:MAX_BUTTONS],  # WA supports up to 3 buttons
             },
         },
     }
-    _post(payload)
+    return _post(payload)
+
+
+def send_list(to: str, prompt: str, button: str, rows: List[Dict[str, str]]) -> bool:
+    """Interactive list: up to 10 rows of id/title(24)/description(72) behind one button."""
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": {
+            "type": "list",
+            "body": {"text": prompt[:1024]},
+            "action": {
+                "button": button[:MAX_BUTTON_TITLE_CHARS],
+                "sections": [
+                    {
+                        "rows": [
+                            {
+                                "id": row["id"],
+                                "title": row["title"][:24],
+                                "description": row.get("description", "")[:72],
+                            }
+                            for row in rows
+                        ][:MAX_LIST_ROWS],
+                    }
+                ],
+            },
+        },
+    }
+    return _post(payload)
+
+
+def _merge_pair(first: Dict, second: Dict) -> Optional[Dict]:
+    """One payload equivalent to sending ``first`` then ``second``, or None."""
+    if first["to"] != second["to"] or first["type"] != "text":
+        return None
+    text = first["text"]["body"]
+    if second["type"] == "text":
+        body = f"{text}\n\n{second['text']['body']}"
+        if len(body) > MAX_BODY_CHARS:
+            return None
+        merged = copy.deepcopy(first)
+        merged["text"]["body"] = body
+        return merged
+    if second["type"] == "interactive" and second["interactive"]["type"] in ("button", "list"):
+        body = f"{text}\n\n{second['interactive']['body']['text']}"
+        if len(body) > MAX_BODY_CHARS:
+            return None
+        merged = copy.deepcopy(second)
+        merged["interactive"]["body"]["text"] = body
+        return merged
+    return None
+
+
+def merge_payloads(payloads: List[Dict]) -> List[Dict]:
+    """Collapse consecutive texts (and a text followed by buttons or a list) for one recipient."""
+    merged: List[Dict] = []
+    for payload in payloads:
+        combined = _merge_pair(merged[-1], payload) if merged else None
+        if combined is None:
+            merged.append(payload)
+        else:
+            merged[-1] = combined
+    return merged
+
+
+def flush(payloads: List[Dict]) -> None:
+    merged = merge_payloads(payloads)
+    saved = len(payloads) - len(merged)
+    if saved:
+        metrics.incr("wa_calls_saved", saved)
+    metrics.incr("wa_calls", len(merged))
+    for payload in merged:
+        _send(payload)
+
+
+@contextmanager
+def batch() -> Iterator[None]:
+    """Queue messages sent in this block and flush them, merged, when it exits normally.
+
+    If the block raises, the queued replies are dropped: the webhook answers 500
+    and Meta's redelivery produces them again.
+    """
+    token = _outbox.set([])
+    try:
+        yield
+    except BaseException:
+        dropped = len(_outbox.get())
+        if dropped:
+            metrics.incr("wa_replies_dropped", dropped)
+        raise
+    finally:
+        queued = _outbox.get()
+        _outbox.reset(token)
+    flush(queued)
@@ -0,0 +1,63 @@
+"""Per-call cost of a webhook-style log line on the request thread.
+
+"inline" is the old setup (JsonFormatter on a synchronous StreamHandler);
+"queued" is app.logging_setup (QueueHandler + background writer).
+Run from the repo root:  python benchmarks/bench_logging.py
+"""
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import logging_setup  # noqa: E402
+
+N = 20_000
+PAYLOAD = {"messaging_product": "whatsapp", "to": "972511111111", "text": {"body": "x" * 2000}}
+
+
+def _run(logger: logging.Logger, arg) -> float:
+    start = time.perf_counter()
+    for i in range(N):
+        if arg is None:
+            logger.info("Handled webhook from %s status=%s", "972511111111", "menu_sent")
+        else:
+            logger.info("WhatsApp send failed (attempt %s): %s", i, arg)
+    return (time.perf_counter() - start) / N * 1e6
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def main() -> None:
+    scenarios = [
+        ("short line", None, None),
+        ("2KB payload", PAYLOAD, None),
+        ("2KB payload, truncated", PAYLOAD, logging_setup.Truncated),
+    ]
+    print(f"{'scenario':<26} {'inline':>9} {'queued':>9} {'queued 10%':>11}   (us/call on request thread)")
+    with open(os.devnull, "w") as devnull:
+        for label, payload, wrap in scenarios:
+            arg = wrap(payload) if wrap and payload is not None else payload
+            inline = logging.StreamHandler(devnull)
+            inline.setFormatter(logging_setup.json_formatter())
+            timings = [_run(_logger(f"bench.inline.{label}", inline), arg)]
+            for rate in (1.0, 0.1):
+                target = logging.StreamHandler(devnull)
+                target.setFormatter(logging_setup.json_formatter())
+                handler, listener = logging_setup.build_queue_handler(target, sample_rate=rate, queue_size=N + 1)
+                listener.start()
+                timings.append(_run(_logger(f"bench.queued.{rate}.{label}", handler), arg))
+                listener.stop()
+            print(f"{label:<26} {timings[0]:>9.2f} {timings[1]:>9.2f} {timings[2]:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
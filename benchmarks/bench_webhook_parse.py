@@ -0,0 +1,62 @@
+"""Compare webhook parsing: stdlib json + dict walk (old path) vs app.payload.parse_webhook.
+
+Run from the repo root:  python benchmarks/bench_webhook_parse.py
+"""
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import payload  # noqa: E402
+
+
+def _make_payload(extra_statuses: int, body_len: int) -> bytes:
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "972500000000", "phone_number_id": "1234567890"},
+        "contacts": [{"profile": {"name": "Test User"}, "wa_id": "972511111111"}],
+        "messages": [
+            {
+                "from": "972511111111",
+                "id": "wamid.HBgMOTcyNTExMTExMTExFQIAEhggQ0E",
+                "timestamp": "1700000000",
+                "type": "text",
+                "text": {"body": "x" * body_len},
+            }
+        ],
+        # Unused fields still cost parse time; Meta batches statuses like these
+        "statuses": [
+            {"id": f"wamid.{i}", "status": "delivered", "timestamp": "1700000000", "recipient_id": "972511111111"}
+            for i in range(extra_statuses)
+        ],
+    }
+    entry = {"id": "1", "changes": [{"value": value, "field": "messages"}]}
+    return json.dumps({"object": "whatsapp_business_account", "entry": [entry]}).encode()
+
+
+def _old_path(raw: bytes):
+    data = json.loads(raw)
+    entry = data.get("entry", [{}])[0].get("changes", [{}])[0].get("value", {})
+    if "messages" not in entry:
+        return None
+    message = entry["messages"][0]
+    contacts = entry.get("contacts", [])
+    name = contacts[0].get("profile", {}).get("name") if contacts else None
+    return message.get("from"), name, message.get("type"), message.get("text", {}).get("body", "")
+
+
+def main() -> None:
+    print(f"orjson available: {payload.orjson is not None}")
+    print(f"{'size (bytes)':>12} {'json+dict (us)':>15} {'parse_webhook (us)':>19} {'speedup':>8}")
+    for statuses, body in [(0, 20), (0, 1000), (20, 200), (200, 200), (1000, 1000)]:
+        raw = _make_payload(statuses, body)
+        number = max(200, 200_000 // max(1, len(raw) // 100))
+        old = min(timeit.repeat(lambda: _old_path(raw), number=number, repeat=5)) / number * 1e6
+        new = min(timeit.repeat(lambda: payload.parse_webhook(raw), number=number, repeat=5)) / number * 1e6
+        print(f"{len(raw):>12} {old:>15.2f} {new:>19.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,19 @@ from typing import List, Tuple
 from zoneinfo import ZoneInfo
 
 import pytest
+
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# The reminder thread would open its own connection to the in-memory DB; tests drive it directly
+os.environ.setdefault("REMINDERS_ENABLED", "false")
 
 from app import calendar as cal
 from app import db
 from app import main
-from app import models, wa_client
+from app import backend, metrics, models, reminders, wa_client
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -33,6 +38,8 @@ def test_engine():
     engine = create_engine(
         "sqlite:///:memory:",
         connect_args={"check_same_thread": False},
+        # One shared connection, so the app (TestClient thread) and tests see the same in-memory DB
+        poolclass=StaticPool,
         future=True,
     )
     models.Base.metadata.create_all(engine)
@@ -52,6 +59,14 @@ def override_db(test_engine, TestingSessionLocal, monkeypatch):
     yield
 
 
+@pytest.fixture(autouse=True)
+def reset_backend():
+    backend.current.clear()
+    metrics.reset()
+    reminders.scheduler.clear()
+    yield
+
+
 @pytest.fixture
 def db_session(TestingSessionLocal):
     session = TestingSessionLocal()
@@ -65,14 +80,21 @@ def db_session(TestingSessionLocal):
 def captured_messages(monkeypatch) -> List[Tuple[str, str]]:
     sent: List[Tuple[str, str]] = []
 
-    def fake_send_text(to: str, text: str) -> None:
+    def fake_send_text(to: str, text: str) -> bool:
         sent.append(("text", text))
+        return True
 
-    def fake_send_buttons(to: str, prompt: str, buttons):
+    def fake_send_buttons(to: str, prompt: str, buttons) -> bool:
         sent.append(("buttons", prompt))
+        return True
+
+    def fake_send_list(to: str, prompt: str, button: str, rows) -> bool:
+        sent.append(("list", prompt))
+        return True
 
     monkeypatch.setattr(wa_client, "send_text", fake_send_text)
     monkeypatch.setattr(wa_client, "send_buttons", fake_send_buttons)
+    monkeypatch.setattr(wa_client, "send_list", fake_send_list)
     return sent
 
 
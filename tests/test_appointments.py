@@ -0,0 +1,187 @@
+import datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import appointments, reminders, wa_client
+from app import calendar as cal
+from app.models import Appointment, ReminderJob
+from tests.test_webhook_flow import _button_payload, _text_payload
+
+
+@pytest.fixture
+def buttons_sent(monkeypatch, captured_messages):
+    sent = []
+
+    def fake_send_buttons(to, prompt, buttons):
+        captured_messages.append(("buttons", prompt))
+        sent.append(buttons)
+
+    monkeypatch.setattr(wa_client, "send_buttons", fake_send_buttons)
+    return sent
+
+
+@pytest.fixture
+def calendar_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(cal, "cancel_appointment", lambda event_id: calls.append(("cancel", event_id)))
+
+    def fake_move(event_id, start_time, duration_minutes, tz):
+        calls.append(("move", event_id, start_time, duration_minutes))
+
+    monkeypatch.setattr(cal, "move_appointment", fake_move)
+    monkeypatch.setattr(cal, "fetch_busy", lambda time_min, time_max: [])
+    return calls
+
+
+def _open_slot(tz, days_ahead, hour=10):
+    """``hour``:00 on the first Sun-Thu (default working days) at least ``days_ahead`` days out."""
+    day = datetime.datetime.now(tz=tz).date() + datetime.timedelta(days=days_ahead)
+    while day.weekday() in (4, 5):
+        day += datetime.timedelta(days=1)
+    return datetime.datetime(day.year, day.month, day.day, hour, tzinfo=tz)
+
+
+@pytest.fixture
+def open_slots(monkeypatch, tz):
+    slots = [_open_slot(tz, 5, hour) for hour in (10, 12, 14)]
+    monkeypatch.setattr(cal, "find_next_slots", lambda **kwargs: slots)
+    return slots
+
+
+@pytest.fixture
+def booked(db_session, tz):
+    start = datetime.datetime.now(tz=tz).replace(hour=10, minute=0, second=0, microsecond=0)
+    start += datetime.timedelta(days=3)
+    appointment = appointments.record(db_session, "4242", "evt-42", start, 70, "cut")
+    reminders.schedule_for_appointment(db_session, "4242", start, "evt-42")
+    db_session.commit()
+    yield appointment
+    db_session.query(Appointment).delete()
+    db_session.query(ReminderJob).delete()
+    db_session.commit()
+
+
+def test_confirm_records_appointment_locally(client, calendar_stubs, db_session, monkeypatch):
+    monkeypatch.setattr(cal, "create_appointment", lambda **kwargs: {"id": "evt-new", "htmlLink": "x"})
+    slot_iso = calendar_stubs[0].isoformat()
+    client.post("/webhook", json=_button_payload(f"slot::trim::{slot_iso}", sender="5151"))
+    client.post("/webhook", json=_text_payload("skip", sender="5151"))
+    client.post("/webhook", json=_button_payload(f"confirm::{slot_iso}", sender="5151"))
+
+    row = db_session.query(Appointment).filter_by(phone="5151").one()
+    assert (row.event_id, row.service_id, row.duration_minutes, row.status) == ("evt-new", "trim", 30, "booked")
+    db_session.delete(row)
+    db_session.commit()
+
+
+def test_my_appointments_and_cancel(client, booked, buttons_sent, calendar_calls, db_session):
+    resp = client.post("/webhook", json=_text_payload("my appointments", sender="4242"))
+    assert resp.json()["status"] == "appointments_sent"
+    assert buttons_sent[-1][0]["id"] == f"appt::{booked.id}"
+
+    resp = client.post("/webhook", json=_button_payload(f"appt::{booked.id}", sender="4242"))
+    assert resp.json()["status"] == "appointment_options"
+
+    resp = client.post("/webhook", json=_button_payload(f"cancel_appt::{booked.id}", sender="4242"))
+    assert resp.json()["status"] == "appointment_cancelled"
+    assert calendar_calls == [("cancel", "evt-42")]
+
+    db_session.expire_all()
+    assert db_session.get(Appointment, booked.id).status == "cancelled"
+    assert {job.status for job in db_session.query(ReminderJob).filter_by(event_id="evt-42")} == {"cancelled"}
+
+
+def test_other_senders_cannot_touch_appointment(client, booked, calendar_calls):
+    resp = client.post("/webhook", json=_button_payload(f"cancel_appt::{booked.id}", sender="9999"))
+    assert resp.json()["status"] == "appointment_missing"
+    assert calendar_calls == []
+
+
+def test_reschedule_moves_event_once(client, booked, buttons_sent, calendar_calls, open_slots, db_session, tz):
+    resp = client.post("/webhook", json=_button_payload(f"resched::{booked.id}", sender="4242"))
+    assert resp.json()["status"] == "slots_sent"
+    reslot = buttons_sent[-1][0]["id"]
+    assert reslot == f"reslot::{booked.id}::{open_slots[0].isoformat()}"
+
+    resp = client.post("/webhook", json=_button_payload(reslot, sender="4242"))
+    assert resp.json()["status"] == "appointment_rescheduled"
+    assert calendar_calls == [("move", "evt-42", open_slots[0], 70)]
+
+    db_session.expire_all()
+    moved = db_session.get(Appointment, booked.id)
+    assert appointments.start_of(moved, tz) == open_slots[0]
+
+
+def test_stale_reslot_button_is_rejected(client, booked, captured_messages, calendar_calls, tz):
+    past = appointments.start_of(booked, tz) - datetime.timedelta(days=30)
+    saturday = _open_slot(tz, 5)
+    while saturday.weekday() != 5:
+        saturday += datetime.timedelta(days=1)
+
+    for new_start in (past, saturday):
+        reslot = f"reslot::{booked.id}::{new_start.isoformat()}"
+        resp = client.post("/webhook", json=_button_payload(reslot, sender="4242"))
+        assert resp.json()["status"] == "slot_unavailable"
+        assert "no longer available" in captured_messages[-1][1]
+    assert calendar_calls == []
+
+
+def test_cancel_treats_event_deleted_in_calendar_as_cancelled(client, booked, db_session, monkeypatch):
+    class Gone:
+        def execute(self):
+            raise HttpError(httplib2.Response({"status": 410}), b"{}")
+
+    class FakeService:
+        def events(self):
+            return self
+
+        def delete(self, calendarId, eventId, sendUpdates):
+            return Gone()
+
+    monkeypatch.setattr(cal, "_get_calendar_service", FakeService)
+    resp = client.post("/webhook", json=_button_payload(f"cancel_appt::{booked.id}", sender="4242"))
+    assert resp.json()["status"] == "appointment_cancelled"
+    db_session.expire_all()
+    assert db_session.get(Appointment, booked.id).status == "cancelled"
+
+
+def test_reschedule_of_deleted_event_cancels_locally(client, booked, captured_messages, db_session, tz, monkeypatch):
+    def gone(event_id, start_time, duration_minutes, tz):
+        raise cal.EventNotFound(event_id)
+
+    monkeypatch.setattr(cal, "fetch_busy", lambda time_min, time_max: [])
+    monkeypatch.setattr(cal, "move_appointment", gone)
+    new_start = _open_slot(tz, 5)
+    resp = client.post("/webhook", json=_button_payload(f"reslot::{booked.id}::{new_start.isoformat()}", sender="4242"))
+    assert resp.json()["status"] == "appointment_gone"
+    assert "already cancelled" in captured_messages[-1][1]
+    db_session.expire_all()
+    assert db_session.get(Appointment, booked.id).status == "cancelled"
+
+
+def test_calendar_error_on_cancel_asks_to_retry(client, booked, captured_messages, db_session, monkeypatch):
+    def failing(event_id):
+        raise HttpError(httplib2.Response({"status": 403}), b"{}")
+
+    monkeypatch.setattr(cal, "cancel_appointment", failing)
+    resp = client.post("/webhook", json=_button_payload(f"cancel_appt::{booked.id}", sender="4242"))
+    assert resp.json()["status"] == "calendar_error"
+    assert "Please try again" in captured_messages[-1][1]
+    db_session.expire_all()
+    assert db_session.get(Appointment, booked.id).status == "booked"
+
+
+def test_reschedule_may_overlap_own_slot_but_not_others(booked, tz, monkeypatch):
+    own_start = appointments.start_of(booked, tz)
+    new_start = own_start + datetime.timedelta(minutes=30)
+    new_end = new_start + datetime.timedelta(minutes=booked.duration_minutes)
+    # Freebusy clips blocks to the query window: the own 10:00-11:10 block comes back as 10:30-11:10
+    own_clipped = (new_start, own_start + datetime.timedelta(minutes=booked.duration_minutes))
+    monkeypatch.setattr(cal, "fetch_busy", lambda time_min, time_max: [own_clipped])
+    assert appointments.can_move_to(booked, new_start)
+
+    # Another client right after our current slot, merged by freebusy into one block
+    monkeypatch.setattr(cal, "fetch_busy", lambda time_min, time_max: [(new_start, new_end)])
+    assert not appointments.can_move_to(booked, new_start)
@@ -0,0 +1,176 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app import backend, ratelimit, state
+
+
+class FakeRedis:
+    """Just enough of redis-py for RedisBackend, with the Lua script emulated in Python."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.data = {}
+        self.hashes = {}
+        self.zsets = {}
+
+    def _expired(self, key):
+        item = self.data.get(key)
+        return item is not None and item[1] is not None and item[1] <= self.now
+
+    def get(self, key):
+        if self._expired(key):
+            del self.data[key]
+        item = self.data.get(key)
+        return item[0] if item else None
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        self.data[key] = (value, self.now + px / 1000 if px else None)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+        self.hashes.pop(key, None)
+        self.zsets.pop(key, None)
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [k for k in list(self.data) + list(self.hashes) if k.startswith(prefix)]
+
+    def register_script(self, lua):
+        if "ZADD" in lua:
+            return self._lease_script
+        return self._bucket_script
+
+    def _lease_script(self, keys, args):
+        limit, lease, token = int(args[0]), float(args[1]), args[2]
+        holders = self.zsets.setdefault(keys[0], {})
+        for member in [m for m, expires_at in holders.items() if expires_at <= self.now]:
+            del holders[member]
+        if len(holders) >= limit:
+            return 0
+        holders[token] = self.now + lease
+        return 1
+
+    def _bucket_script(self, keys, args):
+        capacity, rate, cost = (float(a) for a in args)
+        tokens, updated = self.hashes.get(keys[0], (capacity, self.now))
+        tokens = min(capacity, tokens + max(0, self.now - updated) * rate)
+        retry = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry = (cost - tokens) / rate
+        self.hashes[keys[0]] = (tokens, self.now)
+        return str(retry)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(backend, "current", backend.RedisBackend(client))
+    return client
+
+
+def test_redis_backend_ttl_and_set_if_absent(fake_redis):
+    shared = backend.current
+    assert shared.set_if_absent("dedupe:1", "1", ttl_seconds=10)
+    assert not shared.set_if_absent("dedupe:1", "1", ttl_seconds=10)
+    assert fake_redis.get("edna:dedupe:1") == "1"
+
+    fake_redis.now += 11
+    assert shared.get("dedupe:1") is None
+    assert shared.set_if_absent("dedupe:1", "1", ttl_seconds=10)
+
+
+def test_rate_limits_are_shared_between_limiters(fake_redis):
+    # Two limiters stand in for two workers pointing at the same Redis
+    worker_a = ratelimit.RateLimiter(capacity=2, refill_rate=1)
+    worker_b = ratelimit.RateLimiter(capacity=2, refill_rate=1)
+    assert worker_a.check("111").allowed
+    assert worker_b.check("111").allowed
+    assert not worker_a.check("111").allowed
+
+    fake_redis.now += 1
+    assert worker_b.check("111").allowed
+
+
+def test_concurrency_cap_is_shared_between_workers(fake_redis):
+    worker_a = ratelimit.ConcurrencyCap("booking", limit=1, wait_seconds=0, lease_seconds=30)
+    worker_b = ratelimit.ConcurrencyCap("booking", limit=1, wait_seconds=0, lease_seconds=30)
+    with worker_a.hold():
+        with pytest.raises(ratelimit.Overloaded):
+            with worker_b.hold():
+                pass
+    with worker_b.hold():
+        pass
+
+    # A holder that died without releasing frees the slot once its lease expires
+    assert backend.current.acquire_lease("concurrency:booking", 1, 30)
+    with pytest.raises(ratelimit.Overloaded):
+        with worker_b.hold():
+            pass
+    fake_redis.now += 31
+    with worker_b.hold():
+        pass
+
+
+def test_pending_state_uses_shared_backend(fake_redis, db_session):
+    tz = ZoneInfo("Asia/Jerusalem")
+    slot = datetime.datetime(2025, 1, 1, 10, 0, tzinfo=tz)
+
+    state.set_pending_slot(db_session, "123", slot, contact_name="Alice", tz=tz, ttl_minutes=1)
+    updated = state.set_note(db_session, "123", "trim only", tz)
+    assert updated is not None and updated.step == "awaiting_confirm"
+
+    pending = state.get_pending(db_session, "123", tz)
+    assert pending.slot == slot
+    assert pending.note == "trim only"
+    # Nothing was written to the SQL fallback
+    assert db_session.query(state.PendingStateModel).count() == 0
+
+    state.clear(db_session, "123")
+    assert state.get_pending(db_session, "123", tz) is None
+
+
+def test_memory_backend_expires_keys():
+    now = [0.0]
+    local = backend.MemoryBackend(clock=lambda: now[0])
+    local.set("k", "v", ttl_seconds=5)
+    assert local.get("k") == "v"
+    now[0] = 5
+    assert local.get("k") is None
+
+
+def test_memory_backend_prunes_expired_keys_on_write():
+    now = [0.0]
+    local = backend.MemoryBackend(clock=lambda: now[0])
+    for i in range(100):
+        assert local.set_if_absent(f"dedupe:{i}", "1", ttl_seconds=1)
+    now[0] = 1000
+    for i in range(2):
+        local.set_if_absent(f"dedupe:new{i}", "1", ttl_seconds=1)
+    assert set(local._data) == {"dedupe:new0", "dedupe:new1"}
+
+
+def test_memory_backend_evicts_soonest_expiring_past_max_keys():
+    now = [0.0]
+    local = backend.MemoryBackend(clock=lambda: now[0], max_keys=3)
+    local.set("availability:gen", "1")  # no TTL: never evicted
+    for i in range(5):
+        local.set(f"k{i}", "v", ttl_seconds=100 + i)
+    assert set(local._data) == {"availability:gen", "k3", "k4"}
+
+
+def test_memory_backend_drops_refilled_buckets():
+    local = backend.MemoryBackend()
+    for i in range(50):
+        local.take(f"ratelimit:{i}", capacity=2, refill_rate=1, cost=1, now=0.0)
+    local.take("ratelimit:late", capacity=2, refill_rate=1, cost=1, now=10.0)
+    assert list(local._buckets) == ["ratelimit:late"]
@@ -0,0 +1,128 @@
+import datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import calendar as cal
+from app import google_api, metrics
+
+
+def _http_error(status: int, reason: str = "") -> HttpError:
+    content = f'{{"error": {{"code": {status}, "errors": [{{"reason": "{reason}"}}]}}}}'.encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+class FakeRequest:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def fresh_google_api(monkeypatch):
+    monkeypatch.setattr(google_api, "rate_limiter", google_api.AdaptiveRateLimiter(rate=1000, max_rate=1000))
+    monkeypatch.setattr(google_api, "breaker", google_api.CircuitBreaker(failure_threshold=2, reset_seconds=60))
+    monkeypatch.setattr(google_api.time, "sleep", lambda seconds: None)
+    yield
+
+
+def test_retries_quota_and_server_errors():
+    request = FakeRequest([_http_error(403, "rateLimitExceeded"), _http_error(503), {"ok": True}])
+    start_rate = google_api.rate_limiter.rate
+
+    assert google_api.execute(request) == {"ok": True}
+    assert request.calls == 3
+    assert google_api.rate_limiter.rate < start_rate
+    assert metrics.snapshot()["gapi_retries"] == 2
+
+
+def test_non_retryable_error_is_raised_immediately():
+    request = FakeRequest([_http_error(403, "forbidden")])
+    with pytest.raises(HttpError):
+        google_api.execute(request)
+    assert request.calls == 1
+    assert google_api.breaker.state == google_api.CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_rejects_without_calling_google():
+    for _ in range(2):
+        with pytest.raises(HttpError):
+            google_api.execute(FakeRequest([_http_error(500)] * google_api.GAPI_MAX_RETRIES))
+    assert google_api.breaker.state == google_api.CircuitBreaker.OPEN
+
+    untouched = FakeRequest([{"ok": True}])
+    with pytest.raises(google_api.CircuitOpenError):
+        google_api.execute(untouched)
+    assert untouched.calls == 0
+
+
+def test_breaker_half_open_trial_closes_on_success():
+    now = [0.0]
+    breaker = google_api.CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 11
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial in flight
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_find_next_slots_serves_last_known_when_circuit_open(monkeypatch, tz):
+    future = datetime.datetime.now(tz=tz).replace(microsecond=0) + datetime.timedelta(days=1)
+    monkeypatch.setattr(cal, "_search_slots", lambda *args: [future])
+    assert cal.find_next_slots(tz, 9, 17, 60, 7, max_slots=3) == [future]
+
+    def circuit_open(*args, **kwargs):
+        raise google_api.CircuitOpenError("freebusy")
+
+    monkeypatch.setattr(cal, "_search_slots", circuit_open)
+    cal.invalidate_availability()
+    slots = cal.find_next_slots(tz, 9, 17, 60, 7, max_slots=3)
+    assert slots == [future]
+    assert metrics.snapshot()["calendar_degraded_served"] == 1
+
+
+class FakeEvents:
+    def __init__(self, insert_outcomes, get_outcomes=()):
+        self.insert_request = FakeRequest(insert_outcomes)
+        self.get_request = FakeRequest(get_outcomes)
+        self.inserted = []
+        self.fetched = []
+
+    def insert(self, calendarId, body, sendUpdates):
+        self.inserted.append(body)
+        return self.insert_request
+
+    def get(self, calendarId, eventId):
+        self.fetched.append(eventId)
+        return self.get_request
+
+
+class FakeService:
+    def __init__(self, events):
+        self._events = events
+
+    def events(self):
+        return self._events
+
+
+def test_create_appointment_retry_after_committed_insert_is_not_duplicated(monkeypatch, tz):
+    # The first insert timed out after Google stored it; the retry hits the client-chosen id
+    events = FakeEvents([TimeoutError("read timed out"), _http_error(409, "duplicate")], [{"id": "stored"}])
+    monkeypatch.setattr(cal, "_get_calendar_service", lambda: FakeService(events))
+
+    start = datetime.datetime(2025, 1, 5, 10, 0, tzinfo=tz)
+    created = cal.create_appointment("Hair", start, 60, "111", None, None, tz)
+
+    assert created == {"id": "stored"}
+    assert events.insert_request.calls == 2
+    assert events.fetched == [events.inserted[0]["id"]]
@@ -0,0 +1,73 @@
+import logging
+import sys
+
+from app import logging_setup, metrics
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _logger(handler):
+    logger = logging.getLogger("tests.logging_setup")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_queue_handler_delivers_via_listener_thread():
+    target = ListHandler()
+    handler, listener = logging_setup.build_queue_handler(target, sample_rate=1.0)
+    logger = _logger(handler)
+    listener.start()
+    logger.info("hello %s", "world")
+    listener.stop()  # drains the queue
+    assert [r.getMessage() for r in target.records] == ["hello world"]
+
+
+def test_prepare_leaves_callers_record_intact():
+    handler, _ = logging_setup.build_queue_handler(ListHandler())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.getLogger("tests").makeRecord(
+            "tests", logging.ERROR, __file__, 1, "failed %s", ("job",), sys.exc_info()
+        )
+    prepared = handler.prepare(record)
+    assert prepared is not record
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ("failed job", None, None)
+    assert "ValueError: boom" in prepared.exc_text
+    # Handlers further down the chain (caplog, Sentry, ...) still see the original
+    assert record.args == ("job",) and record.exc_info[0] is ValueError
+
+
+def test_sampling_never_drops_warnings():
+    target = ListHandler()
+    handler, listener = logging_setup.build_queue_handler(target, sample_rate=0.0)
+    logger = _logger(handler)
+    listener.start()
+    for _ in range(10):
+        logger.info("noise")
+    logger.warning("important")
+    listener.stop()
+    assert [r.getMessage() for r in target.records] == ["important"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler, _ = logging_setup.build_queue_handler(ListHandler(), queue_size=1)
+    logger = _logger(handler)
+    logger.info("fits")
+    logger.info("dropped")  # listener not started, queue is full
+    assert metrics.snapshot()["log_records_dropped"] == 1
+
+
+def test_truncated_payload():
+    assert str(logging_setup.Truncated("short", limit=10)) == "short"
+    assert str(logging_setup.Truncated("x" * 30, limit=10)) == "xxxxxxxxxx...(+20 chars)"
+    assert str(logging_setup.Truncated({"a": 1}, limit=100)) == "{'a': 1}"
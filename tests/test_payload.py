@@ -0,0 +1,43 @@
+import json
+
+from app import payload
+from tests.test_webhook_flow import _button_payload, _text_payload
+
+
+def _raw(data) -> bytes:
+    return json.dumps(data).encode()
+
+
+def test_parse_text_message():
+    message = payload.parse_webhook(_raw(_text_payload("hello", sender="123", name="Dana")))
+    assert message.sender == "123"
+    assert message.contact_name == "Dana"
+    assert message.msg_type == "text"
+    assert message.text_body == "hello"
+    assert message.button_id is None
+    assert message.message_id.startswith("wamid.")
+
+
+def test_parse_button_reply():
+    message = payload.parse_webhook(_raw(_button_payload("menu_book")))
+    assert message.msg_type == "interactive"
+    assert message.button_id == "menu_book"
+    assert message.text_body == ""
+
+
+def test_parse_list_reply():
+    data = _button_payload("service::wash")
+    message_body = data["entry"][0]["changes"][0]["value"]["messages"][0]
+    message_body["interactive"] = {"type": "list_reply", "list_reply": {"id": "service::wash", "title": "Wash"}}
+    assert payload.parse_webhook(_raw(data)).button_id == "service::wash"
+
+
+def test_status_callbacks_are_ignored():
+    status_only = {"entry": [{"changes": [{"value": {"statuses": [{"id": "wamid.x", "status": "read"}]}}]}]}
+    assert payload.parse_webhook(_raw(status_only)) is None
+    assert payload.parse_webhook(b"{}") is None
+
+
+def test_invalid_json_is_rejected(client):
+    resp = client.post("/webhook", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert resp.status_code == 400
@@ -0,0 +1,56 @@
+from app import backend, metrics, ratelimit
+from tests.test_webhook_flow import _text_payload
+
+
+def test_token_bucket_refills_over_time():
+    now = [1000.0]
+    store = backend.MemoryBackend(clock=lambda: now[0])
+    limiter = ratelimit.RateLimiter(capacity=2, refill_rate=0.5, store=store)
+
+    assert limiter.check("111").allowed
+    assert limiter.check("111").allowed
+    blocked = limiter.check("111")
+    assert not blocked.allowed
+    assert blocked.retry_after == 2.0
+
+    # Other senders have their own bucket
+    assert limiter.check("222").allowed
+
+    now[0] += 2.0
+    assert limiter.check("111").allowed
+
+
+def test_notice_sent_once_per_window():
+    now = [0.0]
+    store = backend.MemoryBackend(clock=lambda: now[0])
+    limiter = ratelimit.RateLimiter(capacity=1, refill_rate=1, notice_seconds=30, store=store)
+    assert limiter.should_notify("111")
+    assert not limiter.should_notify("111")
+    now[0] += 31
+    assert limiter.should_notify("111")
+
+
+def test_webhook_throttles_spamming_sender(client, captured_messages, monkeypatch):
+    monkeypatch.setattr(ratelimit.limiter, "capacity", 2)
+
+    statuses = [client.post("/webhook", json=_text_payload("book", sender="777")).json()["status"] for _ in range(5)]
+    assert statuses[:2] == ["menu_sent", "menu_sent"]
+    assert statuses[2:] == ["throttled"] * 3
+
+    # Exactly one "please wait" reply despite three throttled messages
+    assert sum(1 for _, text in captured_messages if text == ratelimit.THROTTLE_REPLY) == 1
+    assert metrics.snapshot()["ratelimit_throttled"] == 3
+    assert client.get("/metrics").json()["ratelimit_throttled"] == 3
+
+
+def test_concurrency_cap_rejects_when_saturated():
+    cap = ratelimit.ConcurrencyCap("test", limit=1, wait_seconds=0)
+    with cap.hold():
+        try:
+            with cap.hold():
+                raise AssertionError("second holder should not get in")
+        except ratelimit.Overloaded:
+            pass
+    with cap.hold():
+        pass
+    assert metrics.snapshot()["overloaded_test"] == 1
@@ -0,0 +1,114 @@
+import datetime
+
+import pytest
+
+from app import reminders, wa_client
+from app.models import ReminderJob
+
+UTC = datetime.timezone.utc
+
+
+@pytest.fixture(autouse=True)
+def empty_jobs(db_session):
+    db_session.query(ReminderJob).delete()
+    db_session.commit()
+
+
+def _scheduler_at(now):
+    return reminders.ReminderScheduler(send_interval=0, clock=lambda: now[0])
+
+
+def test_schedule_creates_jobs_for_future_offsets(db_session, monkeypatch):
+    now = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=UTC)
+    monkeypatch.setattr(reminders, "_utcnow", lambda: now)
+    monkeypatch.setattr(reminders, "scheduler", _scheduler_at([now]))
+
+    # Appointment in 5 hours: the 24h reminder is already in the past, only the 2h one remains
+    start = now + datetime.timedelta(hours=5)
+    jobs = reminders.schedule_for_appointment(db_session, "111", start, "evt1")
+    assert reminders.scheduler.next_due() is None  # not visible to the worker before commit
+    db_session.commit()
+
+    assert [reminders.as_utc(job.remind_at) for job in jobs] == [start - datetime.timedelta(hours=2)]
+    assert reminders.scheduler.next_due() == start - datetime.timedelta(hours=2)
+
+
+def test_due_reminders_sent_once_and_survive_restart(db_session, captured_messages, monkeypatch):
+    created = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=UTC)
+    monkeypatch.setattr(reminders, "_utcnow", lambda: created)
+    start = created + datetime.timedelta(hours=30)
+    reminders.schedule_for_appointment(db_session, "111", start, "evt1")
+    db_session.commit()
+
+    # Simulate a restart: a fresh scheduler reloads pending rows from the table only
+    now = [created]
+    restarted = _scheduler_at(now)
+    assert restarted.load_pending() == 2
+    assert restarted.run_due() == 0
+
+    now[0] = start - datetime.timedelta(hours=24)
+    assert restarted.run_due() == 1
+    assert any("Reminder" in text for kind, text in captured_messages if kind == "text")
+
+    # A second worker holding the same job ids cannot send them again
+    other = _scheduler_at(now)
+    other.load_pending()
+    now[0] = start - datetime.timedelta(hours=1)
+    assert restarted.run_due() == 1
+    assert other.run_due() == 0
+
+    db_session.expire_all()
+    statuses = sorted(job.status for job in db_session.query(ReminderJob).all())
+    assert statuses == ["sent", "sent"]
+
+
+def test_rolled_back_jobs_are_never_queued(db_session, monkeypatch):
+    now = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=UTC)
+    monkeypatch.setattr(reminders, "_utcnow", lambda: now)
+    monkeypatch.setattr(reminders, "scheduler", _scheduler_at([now]))
+
+    reminders.schedule_for_appointment(db_session, "111", now + datetime.timedelta(hours=30), "evt1")
+    db_session.rollback()
+    db_session.commit()
+    assert reminders.scheduler.next_due() is None
+
+
+def test_failed_send_is_retried_not_marked_sent(db_session, monkeypatch):
+    created = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=UTC)
+    monkeypatch.setattr(reminders, "_utcnow", lambda: created)
+    start = created + datetime.timedelta(hours=30)
+    reminders.schedule_for_appointment(db_session, "111", start, "evt1")
+    db_session.commit()
+
+    now = [start - datetime.timedelta(hours=24)]
+    worker = _scheduler_at(now)
+    worker.load_pending()
+    monkeypatch.setattr(wa_client, "send_text", lambda to, text: False)
+    assert worker.run_due() == 0
+
+    db_session.expire_all()
+    assert sorted(job.status for job in db_session.query(ReminderJob).all()) == ["pending", "pending"]
+    assert worker.next_due() == now[0] + datetime.timedelta(minutes=reminders.REMINDER_RETRY_MINUTES)
+
+
+def test_stale_sending_rows_are_reclaimed(db_session, captured_messages, monkeypatch):
+    created = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=UTC)
+    monkeypatch.setattr(reminders, "_utcnow", lambda: created)
+    start = created + datetime.timedelta(hours=30)
+    reminders.schedule_for_appointment(db_session, "111", start, "evt1")
+    db_session.commit()
+
+    # A worker claimed the 24h reminder and died before recording the outcome
+    job = db_session.query(ReminderJob).order_by(ReminderJob.remind_at).first()
+    job.status, job.claimed_at = "sending", start - datetime.timedelta(hours=24)
+    db_session.commit()
+
+    now = [start - datetime.timedelta(hours=24, minutes=-5)]
+    recent = reminders.ReminderScheduler(send_interval=0, claim_timeout=600, clock=lambda: now[0])
+    assert recent.load_pending() == 1  # claim is only 5 minutes old: still owned by its worker
+
+    now[0] += datetime.timedelta(minutes=10)
+    assert recent.load_pending() == 1
+    assert recent.run_due() == 1
+    db_session.expire_all()
+    assert db_session.get(ReminderJob, job.id).status == "sent"
@@ -0,0 +1,123 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+from app import calendar as cal
+from app import schedule
+
+TZ = ZoneInfo("Asia/Jerusalem")
+SUNDAY = datetime.date(2025, 1, 5)
+
+
+def _at(day, hour, minute=0):
+    return datetime.datetime(day.year, day.month, day.day, hour, minute, tzinfo=TZ)
+
+
+def _compile(**kwargs):
+    rules = schedule.WorkingRules(
+        weekly_hours=schedule.parse_day_ranges(kwargs.pop("hours", "sun-thu=09:00-17:00;fri=09:00-13:00")),
+        **kwargs,
+    )
+    return schedule.CompiledSchedule(rules, TZ)
+
+
+def test_bitmap_helpers():
+    mask = schedule.span_mask(3, 7) | schedule.span_mask(10, 12)
+    assert schedule.runs(mask) == [(3, 7), (10, 12)]
+    assert list(schedule.set_bits(schedule.fits_mask(mask, 3))) == [3, 4]
+    assert schedule.fits_mask(mask, 5) == 0
+
+
+def test_parse_day_ranges_wraps_week():
+    parsed = schedule.parse_day_ranges("sun-tue=09:00-12:00,13:00-17:00")
+    assert sorted(parsed) == [0, 1, 6]
+    assert parsed[6] == ((540, 720), (780, 1020))
+
+
+def test_default_rules_skip_friday_and_saturday():
+    rules = schedule.CompiledSchedule(schedule.default_rules(9, 17), TZ)
+    friday, saturday = SUNDAY + datetime.timedelta(days=5), SUNDAY + datetime.timedelta(days=6)
+    assert rules.day_mask(friday) == 0 and rules.day_mask(saturday) == 0
+    starts = rules.free_starts(SUNDAY, [], length=60, step=60)
+    assert [s.hour for s in starts] == [9, 10, 11, 12, 13, 14, 15, 16]
+
+
+def test_lunch_break_busy_time_and_short_friday():
+    rules = _compile(breaks=schedule.parse_day_ranges("13:00-13:30"))
+    busy = [(_at(SUNDAY, 10, 15), _at(SUNDAY, 11, 0))]
+    starts = rules.free_starts(SUNDAY, busy, length=60, step=60)
+    assert [s.strftime("%H:%M") for s in starts] == ["09:00", "11:00", "12:00", "13:30", "14:30", "15:30"]
+
+    friday = SUNDAY + datetime.timedelta(days=5)
+    assert [s.hour for s in rules.free_starts(friday, [], length=60, step=60)] == [9, 10, 11, 12]
+
+
+def test_holidays_and_closures():
+    monday = SUNDAY + datetime.timedelta(days=1)
+    rules = _compile(
+        holidays=frozenset({SUNDAY}),
+        closures=schedule.parse_closures("2025-01-06T12:00/2025-01-06T17:00", TZ),
+    )
+    assert rules.free_starts(SUNDAY, [], length=60, step=60) == []
+    assert [s.hour for s in rules.free_starts(monday, [], length=60, step=60)] == [9, 10, 11]
+
+
+def test_covers_checks_hours_breaks_and_holidays():
+    rules = _compile(breaks=schedule.parse_day_ranges("13:00-13:30"), holidays=frozenset({SUNDAY}))
+    monday = SUNDAY + datetime.timedelta(days=1)
+    assert rules.covers(_at(monday, 9), 60)
+    assert not rules.covers(_at(monday, 12, 30), 60)  # runs into lunch
+    assert not rules.covers(_at(monday, 16, 30), 60)  # past closing
+    assert not rules.covers(_at(SUNDAY, 10), 60)
+
+
+def test_search_uses_one_bulk_freebusy_call(monkeypatch):
+    rules = schedule.CompiledSchedule(schedule.default_rules(9, 12), TZ)
+    calls = []
+
+    def fake_busy(time_min, time_max):
+        calls.append((time_min, time_max))
+        return [(_at(SUNDAY, 9), _at(SUNDAY, 10))]
+
+    monkeypatch.setattr(cal, "fetch_busy", fake_busy)
+    now = _at(SUNDAY, 8)
+    slots = cal._search_slots(now, now + datetime.timedelta(minutes=30), rules, 60, lookahead_days=3, max_slots=4)
+
+    assert len(calls) == 1
+    monday = SUNDAY + datetime.timedelta(days=1)
+    # Monday 10:00 would split the morning in two; its edges are preferred
+    assert slots == [_at(SUNDAY, 10), _at(SUNDAY, 11), _at(monday, 9), _at(monday, 11)]
+
+
+def test_placements_prefer_gap_edges_and_avoid_unusable_leftovers():
+    rules = schedule.CompiledSchedule(schedule.default_rules(9, 17), TZ)
+    # Busy 9:00-10:15 and 12:00-17:00 leaves a 105-minute gap
+    busy = [(_at(SUNDAY, 9), _at(SUNDAY, 10, 15)), (_at(SUNDAY, 12), _at(SUNDAY, 17))]
+    ranked = sorted(rules.placements(SUNDAY, busy, length=60, step=30, min_fragment=30))
+    best = [(wasted, fragments, start.strftime("%H:%M")) for wasted, fragments, start in ranked[:2]]
+    # Flush against either busy block leaves one usable 45-minute piece
+    assert best == [(0, 1, "10:15"), (0, 1, "11:00")]
+    # 10:30 would strand 15 minutes before it
+    assert (15, 2, "10:30") in [(w, f, s.strftime("%H:%M")) for w, f, s in ranked]
+
+
+def test_lead_time_cut_is_not_a_gap_edge(monkeypatch):
+    rules = schedule.CompiledSchedule(schedule.default_rules(9, 17), TZ)
+    monkeypatch.setattr(cal, "fetch_busy", lambda time_min, time_max: [])
+    now = _at(SUNDAY, 10, 7).replace(second=20)
+    slots = cal._search_slots(now, now + datetime.timedelta(minutes=30), rules, 60, 1, 6, step_minutes=30)
+    # No odd 10:38 start, and 11:00 is not penalised for the unbookable time before now
+    assert [slot.strftime("%H:%M") for slot in slots] == ["11:00", "11:30", "12:00", "12:30", "13:00", "16:00"]
+
+    ranked = sorted(rules.placements(SUNDAY, [], length=60, step=30, min_fragment=30, earliest=_at(SUNDAY, 10, 38)))
+    assert [(w, f, s.strftime("%H:%M")) for w, f, s in ranked[:2]] == [(0, 1, "11:00"), (0, 1, "16:00")]
+
+
+def test_utc_busy_blocks_map_to_wall_clock_on_dst_change_day():
+    # Israel leaves DST at 02:00 on Sunday 2025-10-26; freebusy answers in UTC
+    day = datetime.date(2025, 10, 26)
+    utc = datetime.timezone.utc
+    busy = [(datetime.datetime(2025, 10, 26, 8, 0, tzinfo=utc), datetime.datetime(2025, 10, 26, 9, 0, tzinfo=utc))]
+    starts = _compile().free_starts(day, busy, length=60, step=60)
+    assert _at(day, 10) not in starts
+    assert _at(day, 9) in starts
+    assert _at(day, 11) in starts
@@ -0,0 +1,57 @@
+import pytest
+
+from app import calendar as cal
+from app import services, wa_client
+from tests.test_webhook_flow import _button_payload, _text_payload
+
+
+def test_parse_catalog():
+    catalog = services.parse_catalog("trim:Trim:30, color:Color:150:15")
+    assert list(catalog) == ["trim", "color"]
+    assert catalog["trim"].total_minutes == 30
+    assert catalog["color"].total_minutes == 165
+
+
+def test_parse_catalog_rejects_what_whatsapp_cannot_show():
+    with pytest.raises(ValueError):
+        services.parse_catalog(",".join(f"s{i}:Service {i}:30" for i in range(11)))
+    with pytest.raises(ValueError):
+        services.parse_catalog("long:Wash cut and blow-dry deluxe:90")
+
+
+def test_more_than_three_services_are_offered_as_a_list(client, captured_messages, monkeypatch):
+    monkeypatch.setattr(services, "CATALOG", services.parse_catalog(services.DEFAULT_SERVICES + ",wash:Wash:20"))
+    lists_sent = []
+    monkeypatch.setattr(wa_client, "send_list", lambda to, prompt, button, rows: lists_sent.append(rows))
+
+    assert client.post("/webhook", json=_button_payload("menu_book")).json()["status"] == "menu_sent"
+    assert [row["id"] for row in lists_sent[-1]] == ["service::trim", "service::cut", "service::color", "service::wash"]
+
+
+def test_service_choice_drives_slot_length_and_booking(client, calendar_stubs, captured_messages, monkeypatch):
+    buttons_sent = []
+    monkeypatch.setattr(wa_client, "send_buttons", lambda to, prompt, buttons: buttons_sent.append(buttons))
+    searches = []
+    monkeypatch.setattr(cal, "find_next_slots", lambda **kwargs: searches.append(kwargs) or calendar_stubs)
+    booked = []
+    monkeypatch.setattr(
+        cal,
+        "create_appointment",
+        lambda **kwargs: booked.append(kwargs) or {"htmlLink": "https://calendar.test/event"},
+    )
+
+    assert client.post("/webhook", json=_button_payload("menu_book")).json()["status"] == "menu_sent"
+    assert [b["id"] for b in buttons_sent[-1]] == ["service::trim", "service::cut", "service::color"]
+
+    assert client.post("/webhook", json=_button_payload("service::color")).json()["status"] == "slots_sent"
+    assert searches[-1]["slot_minutes"] == 165
+    assert searches[-1]["min_fragment_minutes"] == 30
+    slot_button = buttons_sent[-1][0]["id"]
+    assert slot_button == f"slot::color::{calendar_stubs[0].isoformat()}"
+
+    client.post("/webhook", json=_button_payload(slot_button))
+    client.post("/webhook", json=_text_payload("skip"))
+    resp = client.post("/webhook", json=_button_payload(f"confirm::{calendar_stubs[0].isoformat()}"))
+    assert resp.json()["status"] == "confirmed"
+    assert booked[-1]["duration_minutes"] == 165
+    assert booked[-1]["summary"] == "Hair appointment - Color"
@@ -0,0 +1,79 @@
+import pytest
+
+from app import metrics, wa_client
+from tests.test_webhook_flow import _button_payload, _text_payload
+
+MENU = [{"id": "menu_book", "title": "Book"}]
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(wa_client, "_send", calls.append)
+    return calls
+
+
+def test_text_then_buttons_become_one_interactive_message(api_calls):
+    with wa_client.batch():
+        wa_client.send_text("111", "Hello!")
+        wa_client.send_buttons("111", "Choose an option:", MENU)
+
+    assert len(api_calls) == 1
+    interactive = api_calls[0]["interactive"]
+    assert interactive["body"]["text"] == "Hello!\n\nChoose an option:"
+    assert interactive["action"]["buttons"][0]["reply"]["id"] == "menu_book"
+    assert metrics.snapshot()["wa_calls_saved"] == 1
+
+
+def test_incompatible_messages_are_kept_in_order(api_calls):
+    with wa_client.batch():
+        wa_client.send_buttons("111", "Pick one", MENU)
+        wa_client.send_text("111", "after buttons")  # buttons must stay last; no merge
+        wa_client.send_text("222", "other recipient")
+        wa_client.send_text("222", "x" * 1020)  # would exceed the body limit
+
+    assert [p["to"] for p in api_calls] == ["111", "111", "222", "222"]
+    assert "wa_calls_saved" not in metrics.snapshot()
+
+
+def test_text_then_list_become_one_message(api_calls):
+    rows = [{"id": f"service::{i}", "title": f"Service {i}"} for i in range(5)]
+    with wa_client.batch():
+        wa_client.send_text("111", "Hello!")
+        wa_client.send_list("111", "Which service?", "Choose", rows)
+
+    assert len(api_calls) == 1
+    interactive = api_calls[0]["interactive"]
+    assert interactive["type"] == "list"
+    assert interactive["body"]["text"] == "Hello!\n\nWhich service?"
+    assert len(interactive["action"]["sections"][0]["rows"]) == 5
+
+
+def test_failed_block_drops_queued_replies(api_calls):
+    with pytest.raises(RuntimeError):
+        with wa_client.batch():
+            wa_client.send_text("111", "half of a reply")
+            raise RuntimeError("handler failed")
+
+    assert api_calls == []
+    assert metrics.snapshot()["wa_replies_dropped"] == 1
+
+
+def test_sends_outside_batch_go_out_immediately(api_calls):
+    wa_client.send_text("111", "now")
+    assert len(api_calls) == 1
+
+
+def test_webhook_default_reply_uses_single_call(client, api_calls):
+    resp = client.post("/webhook", json=_text_payload("hello there", sender="3030"))
+    assert resp.json()["status"] == "menu_sent"
+    assert len(api_calls) == 1
+    assert api_calls[0]["type"] == "interactive"
+    assert api_calls[0]["interactive"]["body"]["text"].startswith("Hi! I can book your appointment")
+
+
+def test_stale_confirm_reply_uses_single_call(client, api_calls):
+    resp = client.post("/webhook", json=_button_payload("confirm::2025-01-01T12:00:00+02:00", sender="3131"))
+    assert resp.json()["status"] == "stale_pending"
+    assert len(api_calls) == 1
+    assert metrics.snapshot()["wa_calls_saved"] == 1
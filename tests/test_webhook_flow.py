@@ -1,6 +1,14 @@
 import datetime
+import uuid
 from zoneinfo import ZoneInfo
 
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import calendar as cal
+from app import state
+
 
 def _text_payload(body: str, sender: str = "111", name: str = "Test User"):
     return {
@@ -12,7 +20,7 @@ def _text_payload(body: str, sender: str = "111", name: str = "Test User"):
                             "messages": [
                                 {
                                     "from": sender,
-                                    "id": "wamid.test",
+                                    "id": f"wamid.{uuid.uuid4().hex}",
                                     "timestamp": "1234567890",
                                     "type": "text",
                                     "text": {"body": body},
@@ -37,7 +45,7 @@ def _button_payload(btn_id: str, sender: str = "111", name: str = "Test User"):
                             "messages": [
                                 {
                                     "from": sender,
-                                    "id": "wamid.button",
+                                    "id": f"wamid.{uuid.uuid4().hex}",
                                     "timestamp": "1234567890",
                                     "type": "interactive",
                                     "interactive": {"button_reply": {"id": btn_id, "title": "btn"}},
@@ -87,3 +95,45 @@ def test_stale_confirm_returns_menu(client, captured_messages):
     assert resp.status_code == 200
     assert resp.json()["status"] == "stale_pending"
     assert any(kind == "buttons" for kind, _ in captured_messages)
+
+
+def test_redelivered_message_is_ignored(client, captured_messages):
+    payload = _text_payload("book")
+    assert client.post("/webhook", json=payload).json()["status"] == "menu_sent"
+    sent = len(captured_messages)
+
+    assert client.post("/webhook", json=payload).json()["status"] == "duplicate"
+    assert len(captured_messages) == sent
+
+
+def test_failed_booking_replies_and_keeps_pending(client, calendar_stubs, captured_messages, monkeypatch):
+    def quota_exhausted(**kwargs):
+        raise HttpError(httplib2.Response({"status": 429}), b"{}")
+
+    slot_iso = calendar_stubs[0].isoformat()
+    client.post("/webhook", json=_button_payload(f"slot::{slot_iso}", sender="4545"))
+    client.post("/webhook", json=_text_payload("skip", sender="4545"))
+    monkeypatch.setattr(cal, "create_appointment", quota_exhausted)
+
+    resp = client.post("/webhook", json=_button_payload(f"confirm::{slot_iso}", sender="4545"))
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "booking_failed"
+    assert "Please press Confirm again" in captured_messages[-1][1]
+
+    monkeypatch.setattr(cal, "create_appointment", lambda **kwargs: {"htmlLink": "https://calendar.test/event"})
+    resp = client.post("/webhook", json=_button_payload(f"confirm::{slot_iso}", sender="4545"))
+    assert resp.json()["status"] == "confirmed"
+
+
+def test_failed_message_is_handled_again_on_redelivery(client, captured_messages, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    payload = _text_payload("hello", sender="4646")
+    with monkeypatch.context() as patch:
+        patch.setattr(state, "get_pending", broken)
+        with pytest.raises(RuntimeError):
+            client.post("/webhook", json=payload)
+
+    # Meta retries the same message id after the 500
+    assert client.post("/webhook", json=payload).json()["status"] == "menu_sent"